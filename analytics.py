@@ -0,0 +1,177 @@
+import operator
+from collections import namedtuple
+from functools import lru_cache
+from sqlalchemy import select, func, bindparam
+from sqlalchemy.orm import sessionmaker
+from schema import engine, User, Workout, NutritionLog, SleepRecord, HealthMetric
+from statements import PreparedQuery
+
+# Connect to session
+Session = sessionmaker(bind=engine)
+session = Session()
+
+Metric = namedtuple('Metric', ['model', 'column', 'aggregate'])
+Dimension = namedtuple('Dimension', ['expression', 'needs_user', 'models'])
+
+AGGREGATES = {'sum': func.sum, 'avg': func.avg, 'min': func.min, 'max': func.max, 'count': func.count}
+
+# Metrics by name, with the model they are measured on and their default aggregate
+METRICS = {
+    'calories_burned': Metric(Workout, Workout.calories_burned, 'sum'),
+    'workout_minutes': Metric(Workout, Workout.duration_minutes, 'sum'),
+    'workouts': Metric(Workout, Workout.id, 'count'),
+    'intake': Metric(NutritionLog, NutritionLog.calories, 'sum'),
+    'sleep_hours': Metric(SleepRecord, SleepRecord.duration_hours, 'avg'),
+    'sleep_quality': Metric(SleepRecord, SleepRecord.quality, 'avg'),
+    'weight': Metric(HealthMetric, HealthMetric.weight, 'avg'),
+    'bmi': Metric(HealthMetric, HealthMetric.bmi, 'avg'),
+    'heart_rate': Metric(HealthMetric, HealthMetric.heart_rate, 'avg'),
+}
+
+# Dimensions by name, as an expression on the metric's model, whether they need the
+# users table, and the models they apply to (None for all)
+DIMENSIONS = {
+    'user': Dimension(lambda model: model.user_id, False, None),
+    'age_bucket': Dimension(lambda model: User.age // 10 * 10, True, None),
+    'gender': Dimension(lambda model: User.gender, True, None),
+    'workout_type': Dimension(lambda model: model.type, False, {Workout}),
+    'intensity': Dimension(lambda model: model.intensity, False, {Workout}),
+    'meal_type': Dimension(lambda model: model.meal_type, False, {NutritionLog}),
+    'food_item': Dimension(lambda model: model.food_item, False, {NutritionLog}),
+    'day': Dimension(lambda model: func.date(model.date), False, None),
+    'week': Dimension(lambda model: func.strftime('%Y-%W', model.date), False, None),
+    'month': Dimension(lambda model: func.strftime('%Y-%m', model.date), False, None),
+    'year': Dimension(lambda model: func.strftime('%Y', model.date), False, None),
+}
+
+OPERATORS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+def _dimension(name, model):
+    """
+    Look up the expression of a dimension for a metric's model.
+
+    Parameters
+    ----------
+    name : str
+        The name of the dimension.
+    model : Base
+        The model the metric is measured on.
+
+    Returns
+    -------
+    Dimension
+        The dimension, with its expression built for the model.
+    """
+    if name not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension {name}.")
+    dimension = DIMENSIONS[name]
+    if dimension.models is not None and model not in dimension.models:
+        raise ValueError(f"Dimension {name} does not apply to {model.__tablename__}.")
+    return dimension._replace(expression=dimension.expression(model))
+
+@lru_cache(maxsize=256)
+def build_query(metric, dimensions=(), filters=(), aggregate=None, start=False, end=False):
+    """
+    Build the grouped statement of an analytics query, with bound parameters in place of
+    the filter values so that the statement is built and compiled once per query shape.
+
+    Parameters
+    ----------
+    metric : str
+        The name of the metric.
+    dimensions : tuple, optional
+        The names of the dimensions to group by. Default is no grouping.
+    filters : tuple, optional
+        (dimension, operator) pairs filtered on, bound as 'filter_0', 'filter_1', ...
+    aggregate : str, optional
+        The aggregate of the metric. Default is the metric's default aggregate.
+    start : bool, optional
+        Whether the metric's date is filtered from the 'start' parameter. Default is False.
+    end : bool, optional
+        Whether the metric's date is filtered before the 'end' parameter. Default is False.
+
+    Returns
+    -------
+    PreparedQuery
+        The prepared statement.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric}.")
+    model, column, default_aggregate = METRICS[metric]
+    aggregate = aggregate or default_aggregate
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate {aggregate}.")
+
+    groups = [_dimension(name, model) for name in dimensions]
+    conditions = []
+    needs_user = any(group.needs_user for group in groups)
+    for index, (name, op) in enumerate(filters):
+        dimension = _dimension(name, model)
+        needs_user = needs_user or dimension.needs_user
+        conditions.append(OPERATORS[op](dimension.expression, bindparam(f'filter_{index}')))
+    if start:
+        conditions.append(model.date >= bindparam('start'))
+    if end:
+        conditions.append(model.date < bindparam('end'))
+
+    statement = select(
+        *[group.expression.label(name) for name, group in zip(dimensions, groups)],
+        AGGREGATES[aggregate](column).label(metric)
+    ).select_from(model)
+    if needs_user:
+        statement = statement.join(User, User.id == model.user_id)
+    if conditions:
+        statement = statement.where(*conditions)
+    if groups:
+        expressions = [group.expression for group in groups]
+        statement = statement.group_by(*expressions).order_by(*expressions)
+    return PreparedQuery(statement)
+
+def run_analytics(session, metric, dimensions=(), filters=None, aggregate=None, start=None, end=None):
+    """
+    Aggregate a metric grouped by any combination of dimensions, in a single grouped
+    SQL statement. Grouping by 'user' groups by user id, so users sharing a name are
+    kept apart.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    metric : str
+        The name of the metric, one of METRICS.
+    dimensions : list, optional
+        The names of the dimensions to group by, from DIMENSIONS. Default is no grouping.
+    filters : dict, optional
+        Values to filter dimensions on, e.g. {'gender': 'Female'}, or (operator, value)
+        pairs, e.g. {'age_bucket': ('>=', 40)}. Default is no filters.
+    aggregate : str, optional
+        The aggregate of the metric, one of AGGREGATES. Default is the metric's default.
+    start : datetime, optional
+        The first date included. Default is no lower bound.
+    end : datetime, optional
+        The date before which rows are included. Default is no upper bound.
+
+    Returns
+    -------
+    list
+        Tuples of the dimension values followed by the metric value, ordered by the dimensions.
+    """
+    filter_shape = []
+    params = {}
+    for index, (name, value) in enumerate((filters or {}).items()):
+        op, value = value if isinstance(value, tuple) else ('==', value)
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator {op}.")
+        filter_shape.append((name, op))
+        params[f'filter_{index}'] = value
+    if start is not None:
+        params['start'] = start
+    if end is not None:
+        params['end'] = end
+
+    query = build_query(metric, tuple(dimensions), tuple(filter_shape), aggregate, start is not None, end is not None)
+    return query.all(session, **params)
+
+if __name__ == "__main__":
+    for age_bucket, gender, sleep_hours in run_analytics(session, 'sleep_hours', ['age_bucket', 'gender']):
+        print(f"Age Group {age_bucket}s, Gender: {gender} - Avg Sleep: {round(sleep_hours, 2)} hours")
@@ -0,0 +1,480 @@
+import hashlib
+import math
+import random
+from collections import namedtuple
+from sqlalchemy import event
+from schema import User, Workout, NutritionLog, SleepRecord, HealthMetric
+
+# Number of standard errors used for the statistical error bounds (~99.7% coverage)
+Z_SCORE = 3.0
+
+Estimate = namedtuple('Estimate', ['value', 'error'])
+Estimate.__doc__ = """
+An approximate result together with its error bound. The exact answer is
+expected to lie within value - error and value + error.
+"""
+
+def _hash64(value, salt=b''):
+    """
+    Hash a value to a 64-bit integer.
+
+    Parameters
+    ----------
+    value : object
+        The value to hash. It is hashed through its string representation.
+    salt : bytes, optional
+        A salt used to derive independent hash functions. Default is no salt.
+
+    Returns
+    -------
+    int
+        The 64-bit hash of the value.
+    """
+    digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8, salt=salt)
+    return int.from_bytes(digest.digest(), 'big')
+
+class ReservoirSample:
+    """
+    A class used to keep a uniform random sample of a stream of items using
+    reservoir sampling (Algorithm R).
+
+    Attributes
+    ----------
+    capacity : int
+        The maximum number of items kept in the sample.
+    seen : int
+        The number of items observed so far.
+    items : list
+        The sampled items.
+    """
+    def __init__(self, capacity=10000, seed=None):
+        self.capacity = capacity
+        self.seen = 0
+        self.items = []
+        self._random = random.Random(seed)
+
+    def add(self, item):
+        """
+        Offer an item to the sample.
+
+        Parameters
+        ----------
+        item : object
+            The item to offer.
+
+        Returns
+        -------
+        None
+        """
+        self.seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+        else:
+            index = self._random.randrange(self.seen)
+            if index < self.capacity:
+                self.items[index] = item
+
+    def correction(self):
+        """
+        Compute the finite population correction for the sample, which is zero
+        when the sample holds every item seen.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        float
+            The finite population correction factor.
+        """
+        if self.seen <= 1:
+            return 0.0
+        return math.sqrt(max(0.0, (self.seen - len(self.items)) / (self.seen - 1)))
+
+class CountMinSketch:
+    """
+    A class used to estimate item frequencies in a stream with a Count-Min
+    sketch, while tracking the heaviest items seen as top-k candidates.
+
+    Estimated counts never undercount, and overcount by at most
+    e / width * total with probability 1 - e ** -depth.
+
+    Attributes
+    ----------
+    width : int
+        The number of counters per row.
+    depth : int
+        The number of rows, each using an independent hash function.
+    total : int
+        The total number of items added.
+    capacity : int
+        The number of heavy hitter candidates tracked.
+    """
+    def __init__(self, width=2048, depth=5, capacity=64):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.capacity = capacity
+        self._rows = [[0] * width for _ in range(depth)]
+        self._salts = [i.to_bytes(2, 'big') for i in range(depth)]
+        self._candidates = {}
+
+    def _indexes(self, item):
+        return [_hash64(item, salt) % self.width for salt in self._salts]
+
+    def add(self, item, count=1):
+        """
+        Add occurrences of an item to the sketch.
+
+        Parameters
+        ----------
+        item : object
+            The item to add.
+        count : int, optional
+            The number of occurrences to add. Default is 1.
+
+        Returns
+        -------
+        int
+            The new estimated count of the item.
+        """
+        self.total += count
+        estimate = None
+        for row, index in zip(self._rows, self._indexes(item)):
+            row[index] += count
+            estimate = row[index] if estimate is None else min(estimate, row[index])
+
+        if item in self._candidates or len(self._candidates) < self.capacity:
+            self._candidates[item] = estimate
+        else:
+            lightest = min(self._candidates, key=self._candidates.get)
+            if self._candidates[lightest] < estimate:
+                del self._candidates[lightest]
+                self._candidates[item] = estimate
+        return estimate
+
+    def error(self):
+        """
+        Compute the maximum overcount of any estimate.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        float
+            The error bound of the estimated counts.
+        """
+        return math.e / self.width * self.total
+
+    def estimate(self, item):
+        """
+        Estimate the number of occurrences of an item.
+
+        Parameters
+        ----------
+        item : object
+            The item to estimate.
+
+        Returns
+        -------
+        Estimate
+            The estimated count. The exact count lies between value - error and value.
+        """
+        count = min(row[index] for row, index in zip(self._rows, self._indexes(item)))
+        return Estimate(count, self.error())
+
+    def top_k(self, k):
+        """
+        Return the most frequent items among the tracked candidates.
+
+        Parameters
+        ----------
+        k : int
+            The number of items to return.
+
+        Returns
+        -------
+        list
+            A list of (item, Estimate) pairs, most frequent first.
+        """
+        ranked = sorted(self._candidates, key=lambda item: self.estimate(item).value, reverse=True)
+        return [(item, self.estimate(item)) for item in ranked[:k]]
+
+class HyperLogLog:
+    """
+    A class used to estimate the number of distinct items in a stream with
+    HyperLogLog.
+
+    Attributes
+    ----------
+    precision : int
+        The number of hash bits used to select a register.
+    registers : bytearray
+        The 2 ** precision registers of the sketch.
+    """
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, item):
+        """
+        Add an item to the sketch.
+
+        Parameters
+        ----------
+        item : object
+            The item to add.
+
+        Returns
+        -------
+        None
+        """
+        hashed = _hash64(item)
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        """
+        Estimate the number of distinct items added.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Estimate
+            The estimated distinct count and its error bound.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros > 0:
+            raw = m * math.log(m / zeros)
+        return Estimate(raw, Z_SCORE * 1.04 / math.sqrt(m) * raw)
+
+def _mean_estimate(values, correction):
+    """
+    Estimate a population mean from sampled values.
+
+    Parameters
+    ----------
+    values : list
+        The sampled values.
+    correction : float
+        The finite population correction of the sample.
+
+    Returns
+    -------
+    Estimate
+        The sample mean and its error bound.
+    """
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return Estimate(mean, math.inf if correction else 0.0)
+    variance = sum((value - mean) ** 2 for value in values) / (n - 1)
+    return Estimate(mean, Z_SCORE * math.sqrt(variance / n) * correction)
+
+class ApproximateAnalytics:
+    """
+    A class used to answer population-level reports approximately from samples
+    and sketches maintained on ingest, instead of scanning the full tables.
+
+    Attributes
+    ----------
+    workout_types : CountMinSketch
+        The frequency sketch of workout types.
+    nutrition_sample : ReservoirSample
+        A sample of (food_item, calories) pairs from the nutrition logs.
+    sleep_sample : ReservoirSample
+        A sample of (user_id, duration_hours, quality) tuples from the sleep records.
+    active_users : HyperLogLog
+        The distinct count sketch of users with logged activity.
+    """
+    def __init__(self, sample_size=10000, sketch_width=2048, sketch_depth=5, hll_precision=12, seed=None):
+        self.workout_types = CountMinSketch(sketch_width, sketch_depth)
+        self.nutrition_sample = ReservoirSample(sample_size, seed)
+        self.sleep_sample = ReservoirSample(sample_size, seed)
+        self.active_users = HyperLogLog(hll_precision)
+
+    def observe(self, record):
+        """
+        Update the samples and sketches with a newly ingested record.
+
+        Parameters
+        ----------
+        record : Workout, NutritionLog, SleepRecord or HealthMetric
+            The ingested record. Records of other types are ignored.
+
+        Returns
+        -------
+        None
+        """
+        if isinstance(record, Workout):
+            self.workout_types.add(record.type)
+        elif isinstance(record, NutritionLog):
+            self.nutrition_sample.add((record.food_item, float(record.calories)))
+        elif isinstance(record, SleepRecord):
+            self.sleep_sample.add((record.user_id, float(record.duration_hours), float(record.quality)))
+        elif not isinstance(record, HealthMetric):
+            return
+        self.active_users.add(record.user_id)
+
+    def load(self, session, chunk_size=10000):
+        """
+        Build the samples and sketches from the rows already in the database,
+        streaming each table in chunks.
+
+        Parameters
+        ----------
+        session : SQLAlchemy session
+            The session object used to interact with the database.
+        chunk_size : int, optional
+            The number of rows fetched per round trip. Default is 10000.
+
+        Returns
+        -------
+        None
+        """
+        for user_id, workout_type in session.query(Workout.user_id, Workout.type).yield_per(chunk_size):
+            self.workout_types.add(workout_type)
+            self.active_users.add(user_id)
+        for user_id, food_item, calories in session.query(
+                NutritionLog.user_id, NutritionLog.food_item, NutritionLog.calories).yield_per(chunk_size):
+            self.nutrition_sample.add((food_item, float(calories)))
+            self.active_users.add(user_id)
+        for user_id, duration, quality in session.query(
+                SleepRecord.user_id, SleepRecord.duration_hours, SleepRecord.quality).yield_per(chunk_size):
+            self.sleep_sample.add((user_id, float(duration), float(quality)))
+            self.active_users.add(user_id)
+        for (user_id,) in session.query(HealthMetric.user_id).yield_per(chunk_size):
+            self.active_users.add(user_id)
+
+    def track(self, session_factory):
+        """
+        Keep the samples and sketches up to date with every record committed
+        through sessions created by the given factory. Records flushed in a
+        transaction that is rolled back are not observed. Records inserted with
+        Core statements, such as those of an IngestBuffer, are not seen by the
+        session; pass observe to the buffer's observers instead.
+
+        Parameters
+        ----------
+        session_factory : sessionmaker or Session
+            The session factory, class or instance to listen on.
+
+        Returns
+        -------
+        None
+        """
+        @event.listens_for(session_factory, 'after_flush')
+        def collect(session, flush_context):
+            session.info.setdefault('approximate_pending', []).extend(session.new)
+
+        @event.listens_for(session_factory, 'after_commit')
+        def apply(session):
+            for record in session.info.pop('approximate_pending', []):
+                self.observe(record)
+
+        @event.listens_for(session_factory, 'after_rollback')
+        def discard(session):
+            session.info.pop('approximate_pending', None)
+
+    def most_common_workout_type(self):
+        """
+        Estimate the most frequently logged workout type.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        tuple or None
+            A (type, Estimate) pair, or None if no workouts were observed.
+        """
+        top = self.workout_types.top_k(1)
+        return top[0] if top else None
+
+    def top_high_calorie_foods(self, limit=5):
+        """
+        Estimate the food items with the highest average calories logged.
+
+        Parameters
+        ----------
+        limit : int, optional
+            The number of food items to return. Default is 5.
+
+        Returns
+        -------
+        list
+            A list of (food_item, Estimate) pairs, highest average first.
+        """
+        calories_by_food = {}
+        for food_item, calories in self.nutrition_sample.items:
+            calories_by_food.setdefault(food_item, []).append(calories)
+
+        correction = self.nutrition_sample.correction()
+        averages = [(food_item, _mean_estimate(values, correction)) for food_item, values in calories_by_food.items()]
+        averages.sort(key=lambda food: food[1].value, reverse=True)
+        return averages[:limit]
+
+    def average_sleep_by_age_group(self, session, chunk_size=500):
+        """
+        Estimate the average sleep duration and quality for each 10-year age group.
+        Only the ages of the sampled users are looked up.
+
+        Parameters
+        ----------
+        session : SQLAlchemy session
+            The session object used to interact with the database.
+        chunk_size : int, optional
+            The number of user ids looked up per query. Default is 500.
+
+        Returns
+        -------
+        list
+            A list of (age_group, duration Estimate, quality Estimate) tuples ordered by age group.
+        """
+        user_ids = list({user_id for user_id, _, _ in self.sleep_sample.items})
+        ages = {}
+        for start in range(0, len(user_ids), chunk_size):
+            ages.update(session.query(User.id, User.age).filter(User.id.in_(user_ids[start:start + chunk_size])).all())
+
+        records_by_group = {}
+        for user_id, duration, quality in self.sleep_sample.items:
+            age = ages.get(user_id)
+            if age is None:
+                continue
+            records_by_group.setdefault(age // 10 * 10, []).append((duration, quality))
+
+        correction = self.sleep_sample.correction()
+        return [
+            (age_group,
+             _mean_estimate([duration for duration, _ in records], correction),
+             _mean_estimate([quality for _, quality in records], correction))
+            for age_group, records in sorted(records_by_group.items())
+        ]
+
+    def distinct_active_users(self):
+        """
+        Estimate the number of distinct users with any logged activity.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Estimate
+            The estimated number of distinct users.
+        """
+        return self.active_users.estimate()
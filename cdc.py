@@ -0,0 +1,196 @@
+import json
+from collections import namedtuple
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import sessionmaker
+from schema import engine, User, Goal, Workout, NutritionLog, SleepRecord, HealthMetric, ChangeLog, ChangeCheckpoint
+
+# Connect to session
+Session = sessionmaker(bind=engine)
+session = Session()
+
+# Tables whose changes are captured
+TRACKED_MODELS = (User, Goal, Workout, NutritionLog, SleepRecord, HealthMetric)
+
+OPERATIONS = {'insert': 'NEW', 'update': 'NEW', 'delete': 'OLD'}
+
+Change = namedtuple('Change', ['seq', 'table_name', 'operation', 'row_id', 'data', 'changed_at'])
+
+def _trigger_name(table_name, operation):
+    return f'cdc_{table_name}_{operation}'
+
+def install_triggers(engine, models=TRACKED_MODELS):
+    """
+    Create the triggers that append every insert, update and delete on the tracked tables
+    to the change log. Triggers capture writes made through the ORM, Core statements and
+    other SQLite clients alike, in the same transaction as the write. Changes are
+    timestamped in local time, like the rest of the database. Installing again replaces
+    existing triggers, so that they are brought up to date.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+    models : tuple, optional
+        The models whose tables are tracked. Default is TRACKED_MODELS.
+
+    Returns
+    -------
+    None
+    """
+    with engine.begin() as connection:
+        for model in models:
+            table = model.__table__
+            for operation, alias in OPERATIONS.items():
+                row = ', '.join(f"'{column.name}', {alias}.{column.name}" for column in table.columns)
+                connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {_trigger_name(table.name, operation)}')
+                connection.exec_driver_sql(
+                    f"CREATE TRIGGER {_trigger_name(table.name, operation)} "
+                    f"AFTER {operation.upper()} ON {table.name} BEGIN "
+                    f"INSERT INTO {ChangeLog.__tablename__} (table_name, operation, row_id, data, changed_at) "
+                    f"VALUES ('{table.name}', '{operation}', {alias}.id, json_object({row}), "
+                    f"strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime') || '000'); END"
+                )
+
+def uninstall_triggers(engine, models=TRACKED_MODELS):
+    """
+    Drop the change capture triggers of the tracked tables.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+    models : tuple, optional
+        The models whose tables are tracked. Default is TRACKED_MODELS.
+
+    Returns
+    -------
+    None
+    """
+    with engine.begin() as connection:
+        for model in models:
+            for operation in OPERATIONS:
+                connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {_trigger_name(model.__tablename__, operation)}')
+
+def read_changes(session, after=0, limit=1000, tables=None):
+    """
+    Read a batch of changes in sequence order.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    after : int, optional
+        The sequence number after which to read. Default is 0, the start of the log.
+    limit : int, optional
+        The maximum number of changes to read. Default is 1000.
+    tables : list, optional
+        The names of the tables to read changes of. Default is all tables.
+
+    Returns
+    -------
+    list
+        The changes, with their data decoded to dicts.
+    """
+    query = select(ChangeLog.seq, ChangeLog.table_name, ChangeLog.operation, ChangeLog.row_id,
+                   ChangeLog.data, ChangeLog.changed_at).where(ChangeLog.seq > after)
+    if tables is not None:
+        query = query.where(ChangeLog.table_name.in_(tables))
+    rows = session.execute(query.order_by(ChangeLog.seq).limit(limit)).all()
+    return [Change(seq, table_name, operation, row_id, json.loads(data) if data is not None else None, changed_at)
+            for seq, table_name, operation, row_id, data, changed_at in rows]
+
+def get_checkpoint(session, consumer):
+    """
+    Get the sequence number of the last change a consumer has processed.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    consumer : str
+        The name of the consumer.
+
+    Returns
+    -------
+    int
+        The last processed sequence number, or 0 if the consumer has not processed any change.
+    """
+    return session.scalar(select(ChangeCheckpoint.last_seq).where(ChangeCheckpoint.consumer == consumer)) or 0
+
+def save_checkpoint(session, consumer, seq):
+    """
+    Record the sequence number of the last change a consumer has processed.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    consumer : str
+        The name of the consumer.
+    seq : int
+        The last processed sequence number.
+
+    Returns
+    -------
+    None
+    """
+    statement = insert(ChangeCheckpoint.__table__).values(consumer=consumer, last_seq=seq)
+    session.execute(statement.on_conflict_do_update(index_elements=['consumer'], set_={'last_seq': seq}))
+    session.commit()
+
+def consume(session, consumer, handler, limit=1000, tables=None):
+    """
+    Pass the next batch of changes after a consumer's checkpoint to a handler, and advance
+    the checkpoint once the handler returns. If the handler raises, the checkpoint is not
+    advanced and the batch is delivered again on the next call.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    consumer : str
+        The name of the consumer.
+    handler : callable
+        A function called with the list of changes.
+    limit : int, optional
+        The maximum number of changes per batch. Default is 1000.
+    tables : list, optional
+        The names of the tables to consume changes of. Default is all tables.
+
+    Returns
+    -------
+    int
+        The number of changes consumed, 0 once the consumer has caught up.
+    """
+    changes = read_changes(session, get_checkpoint(session, consumer), limit, tables)
+    if not changes:
+        return 0
+    handler(changes)
+    save_checkpoint(session, consumer, changes[-1].seq)
+    return len(changes)
+
+def prune_changes(session):
+    """
+    Delete the changes that every consumer has processed.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    int
+        The number of changes deleted.
+    """
+    processed = session.scalar(select(func.min(ChangeCheckpoint.last_seq)))
+    if processed is None:
+        return 0
+    result = session.execute(delete(ChangeLog).where(ChangeLog.seq <= processed), execution_options={'synchronize_session': False})
+    session.commit()
+    return result.rowcount
+
+if __name__ == "__main__":
+    install_triggers(engine)
+    print("Change data capture triggers installed.")
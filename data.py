@@ -10,6 +10,23 @@ fake = Faker()
 Session = sessionmaker(bind=engine)
 session = Session()
 
+def seed(value):
+    """
+    Seed the random generators used to create fake data, so that the same seed creates
+    the same users, and the same records for the same users within the same year.
+
+    Parameters
+    ----------
+    value : int
+        The seed.
+
+    Returns
+    -------
+    None
+    """
+    random.seed(value)
+    fake.seed_instance(value)
+
 def create_fake_users(n=10):
     """
     Create a given number of fake users for the database.
@@ -0,0 +1,291 @@
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, union, func, case, and_, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import sessionmaker
+from schema import engine, Goal, GoalProgress, GoalWatermark, Workout, NutritionLog, SleepRecord, HealthMetric
+
+# Connect to session
+Session = sessionmaker(bind=engine)
+session = Session()
+
+GoalThreshold = namedtuple('GoalThreshold', ['metric', 'comparison', 'threshold', 'period_days'])
+GoalThreshold.__doc__ = """
+A structured goal target: the metric must be 'at_least' or 'at_most' the threshold
+when evaluated over the last period_days days.
+"""
+
+DEFAULT_PERIOD_DAYS = 30
+WEIGHT_CHANGE_PERIOD_DAYS = 90
+PERIOD_UNITS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+# Tables whose new rows can change a user's goal progress
+SOURCES = (Workout, NutritionLog, SleepRecord, HealthMetric)
+
+NUMBER = r'(\d+(?:\.\d+)?)'
+AT_MOST = re.compile(r'\b(at most|under|below|less than|no more than|maximum|max)\b')
+
+def _parse_period(text):
+    """
+    Parse the evaluation period of a target, e.g. 'in 3 months'.
+
+    Parameters
+    ----------
+    text : str
+        The lower-cased target text.
+
+    Returns
+    -------
+    int or None
+        The period in days, or None if the target does not state one.
+    """
+    match = re.search(r'\b(?:in|over|within|for) (\d+) (day|week|month|year)s?\b', text)
+    return int(match.group(1)) * PERIOD_UNITS[match.group(2)] if match else None
+
+def _parse_rate(text):
+    """
+    Parse the rate of a target, e.g. 'per day' or 'weekly'.
+
+    Parameters
+    ----------
+    text : str
+        The lower-cased target text.
+
+    Returns
+    -------
+    str or None
+        'day' or 'week', or None if the target does not state a rate.
+    """
+    match = re.search(r'\b(?:per|a|each|every) (day|night|week)\b|\b(daily|nightly|weekly)\b', text)
+    if match is None:
+        return None
+    return 'week' if 'week' in match.group(0) else 'day'
+
+def parse_target(goal_type, target):
+    """
+    Parse the free-text target of a goal into a structured threshold. The goal type
+    is used as context, e.g. a 'Sleep' goal with target '8 hours'.
+
+    Parameters
+    ----------
+    goal_type : str
+        The type of the goal.
+    target : str
+        The target of the goal.
+
+    Returns
+    -------
+    GoalThreshold or None
+        The parsed threshold, or None if the target is not understood.
+    """
+    text = f'{goal_type} {target}'.lower()
+    period = _parse_period(text)
+    rate = _parse_rate(text)
+    comparison = 'at_most' if AT_MOST.search(text) else 'at_least'
+
+    match = re.search(rf'\b(lose|gain) {NUMBER} ?(?:kg|kgs|kilograms?)\b', text)
+    if match:
+        change = float(match.group(2))
+        if match.group(1) == 'lose':
+            return GoalThreshold('weight_change', 'at_most', -change, period or WEIGHT_CHANGE_PERIOD_DAYS)
+        return GoalThreshold('weight_change', 'at_least', change, period or WEIGHT_CHANGE_PERIOD_DAYS)
+
+    match = re.search(rf'{NUMBER} ?(?:kg|kgs|kilograms?)\b', text)
+    if match:
+        if 'loss' in text or 'lose' in text:
+            comparison = 'at_most'
+        return GoalThreshold('weight', comparison, float(match.group(1)), period or DEFAULT_PERIOD_DAYS)
+
+    match = re.search(rf'{NUMBER} ?(?:kcal|calories|cal)\b', text)
+    if match:
+        value = float(match.group(1))
+        if re.search(r'\b(burn|burned|burning|workouts?|exercise)\b', text):
+            weekly = value * 7 if rate == 'day' else value
+            return GoalThreshold('calories_burned_per_week', comparison, weekly, period or DEFAULT_PERIOD_DAYS)
+        daily = value / 7 if rate == 'week' else value
+        return GoalThreshold('daily_calories', comparison, daily, period or DEFAULT_PERIOD_DAYS)
+
+    if 'sleep' in text:
+        if 'quality' in text:
+            match = re.search(NUMBER, target.lower())
+            if match:
+                return GoalThreshold('sleep_quality', comparison, float(match.group(1)), period or DEFAULT_PERIOD_DAYS)
+        match = re.search(rf'{NUMBER} ?(?:hours?|hrs?|h)\b', text)
+        if match:
+            return GoalThreshold('sleep_hours', comparison, float(match.group(1)), period or DEFAULT_PERIOD_DAYS)
+
+    match = re.search(rf'{NUMBER} ?(?:minutes|mins?)\b', text)
+    if match:
+        value = float(match.group(1))
+        weekly = value * 7 if rate == 'day' else value
+        return GoalThreshold('workout_minutes_per_week', comparison, weekly, period or DEFAULT_PERIOD_DAYS)
+
+    match = re.search(rf'{NUMBER} ?(?:workouts?|sessions?|times)\b', text)
+    if match:
+        value = float(match.group(1))
+        weekly = value * 7 if rate == 'day' else value
+        return GoalThreshold('workouts_per_week', comparison, weekly, period or DEFAULT_PERIOD_DAYS)
+
+    return None
+
+def _latest_weight(start, period_days):
+    return select(HealthMetric.weight).where(
+        HealthMetric.user_id == GoalProgress.user_id, HealthMetric.weight != None
+    ).order_by(HealthMetric.date.desc()).limit(1).scalar_subquery()
+
+def _weight_change(start, period_days):
+    in_period = (HealthMetric.user_id == GoalProgress.user_id, HealthMetric.date >= start, HealthMetric.weight != None)
+    last = select(HealthMetric.weight).where(*in_period).order_by(HealthMetric.date.desc()).limit(1).scalar_subquery()
+    first = select(HealthMetric.weight).where(*in_period).order_by(HealthMetric.date).limit(1).scalar_subquery()
+    return last - first
+
+def _sleep_average(column):
+    def metric(start, period_days):
+        return select(func.avg(column)).where(
+            SleepRecord.user_id == GoalProgress.user_id, SleepRecord.date >= start
+        ).scalar_subquery()
+    return metric
+
+def _daily_calories(start, period_days):
+    # Average over the days that have nutrition logs
+    return select(func.sum(NutritionLog.calories) / func.count(func.distinct(func.date(NutritionLog.date)))).where(
+        NutritionLog.user_id == GoalProgress.user_id, NutritionLog.date >= start
+    ).scalar_subquery()
+
+def _workouts_per_week(aggregate):
+    def metric(start, period_days):
+        return select(func.coalesce(aggregate, 0) * 7.0 / period_days).where(
+            Workout.user_id == GoalProgress.user_id, Workout.date >= start
+        ).scalar_subquery()
+    return metric
+
+# SQL expressions computing each metric for the user of a goal progress row
+METRICS = {
+    'weight': _latest_weight,
+    'weight_change': _weight_change,
+    'sleep_quality': _sleep_average(SleepRecord.quality),
+    'sleep_hours': _sleep_average(SleepRecord.duration_hours),
+    'daily_calories': _daily_calories,
+    'workout_minutes_per_week': _workouts_per_week(func.sum(Workout.duration_minutes)),
+    'calories_burned_per_week': _workouts_per_week(func.sum(Workout.calories_burned)),
+    'workouts_per_week': _workouts_per_week(func.count(Workout.id)),
+}
+
+def sync_goal_targets(session, chunk_size=500):
+    """
+    Parse the targets of new or changed goals into goal progress rows, and remove the
+    progress of deleted goals. Goals whose targets are already parsed are not reparsed.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    chunk_size : int, optional
+        The number of goal progress rows written per statement. Default is 500.
+
+    Returns
+    -------
+    int
+        The number of goals parsed.
+    """
+    session.query(GoalProgress).filter(
+        GoalProgress.goal_id.not_in(select(Goal.id))
+    ).delete(synchronize_session=False)
+
+    changed_goals = session.query(Goal.id, Goal.user_id, Goal.goal_type, Goal.target).outerjoin(
+        GoalProgress, GoalProgress.goal_id == Goal.id
+    ).filter(or_(
+        GoalProgress.goal_id == None,
+        GoalProgress.user_id != Goal.user_id,
+        GoalProgress.goal_type != Goal.goal_type,
+        GoalProgress.target != Goal.target
+    )).all()
+
+    rows = []
+    for goal_id, user_id, goal_type, target in changed_goals:
+        threshold = parse_target(goal_type, target) or GoalThreshold(None, None, None, None)
+        rows.append({'goal_id': goal_id, 'user_id': user_id, 'goal_type': goal_type, 'target': target,
+                     **threshold._asdict(), 'value': None, 'achieved': None, 'evaluated_at': None})
+
+    statement = insert(GoalProgress.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=['goal_id'],
+        set_={column.name: statement.excluded[column.name] for column in GoalProgress.__table__.columns if column.name != 'goal_id'}
+    )
+    for start in range(0, len(rows), chunk_size):
+        session.execute(statement, rows[start:start + chunk_size])
+    return len(rows)
+
+def refresh_goal_progress(session, now=None, full=False, stale_after=timedelta(days=1)):
+    """
+    Evaluate the progress of all users' goals with one set-based statement per metric
+    and evaluation period, and store the results as goal progress snapshots.
+
+    Unless a full refresh is requested, only goals that are new, changed, older than
+    stale_after, or whose users have rows added since the last refresh are evaluated.
+    Stale snapshots are refreshed because their evaluation period moves with time.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    now : datetime, optional
+        The time of the evaluation. Default is the current time.
+    full : bool, optional
+        Whether to evaluate every goal. Default is False.
+    stale_after : timedelta, optional
+        The age after which a snapshot is evaluated again. Default is one day.
+
+    Returns
+    -------
+    int
+        The number of goals evaluated.
+    """
+    now = now or datetime.now()
+    high_water = {source.__tablename__: session.query(func.max(source.id)).scalar() or 0 for source in SOURCES}
+    sync_goal_targets(session)
+
+    scope = GoalProgress.metric != None
+    if not full:
+        watermarks = dict(session.query(GoalWatermark.table_name, GoalWatermark.last_id).all())
+        changed_users = union(*[
+            select(source.user_id).where(source.id > watermarks.get(source.__tablename__, 0)) for source in SOURCES
+        ])
+        scope = and_(scope, or_(
+            GoalProgress.evaluated_at == None,
+            GoalProgress.evaluated_at < now - stale_after,
+            GoalProgress.user_id.in_(changed_users)
+        ))
+
+    evaluated = 0
+    groups = session.query(GoalProgress.metric, GoalProgress.period_days).filter(scope).distinct().all()
+    for metric, period_days in groups:
+        start = now - timedelta(days=period_days)
+        result = session.execute(
+            update(GoalProgress).where(
+                scope, GoalProgress.metric == metric, GoalProgress.period_days == period_days
+            ).values(value=METRICS[metric](start, period_days), evaluated_at=now),
+            execution_options={'synchronize_session': False}
+        )
+        evaluated += result.rowcount
+
+    session.execute(
+        update(GoalProgress).where(GoalProgress.evaluated_at == now).values(achieved=case(
+            (GoalProgress.value == None, False),
+            (GoalProgress.comparison == 'at_most', GoalProgress.value <= GoalProgress.threshold),
+            else_=GoalProgress.value >= GoalProgress.threshold
+        )),
+        execution_options={'synchronize_session': False}
+    )
+
+    statement = insert(GoalWatermark.__table__)
+    session.execute(
+        statement.on_conflict_do_update(index_elements=['table_name'], set_={'last_id': statement.excluded.last_id}),
+        [{'table_name': table_name, 'last_id': last_id} for table_name, last_id in high_water.items()]
+    )
+    session.commit()
+    return evaluated
+
+if __name__ == "__main__":
+    print(f"Evaluated {refresh_goal_progress(session)} goals.")
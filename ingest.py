@@ -0,0 +1,449 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future
+from datetime import datetime
+from sqlalchemy import DateTime, insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from schema import engine, Workout, NutritionLog, SleepRecord, HealthMetric
+
+# Connect to session
+Session = sessionmaker(bind=engine)
+
+# Models that can be ingested through the buffer, by table name
+MODELS = {model.__tablename__: model for model in (HealthMetric, Workout, NutritionLog, SleepRecord)}
+
+PendingEvent = namedtuple('PendingEvent', ['seq', 'table', 'values', 'future', 'received'])
+
+def _is_transient(error):
+    """
+    Check whether a write failed because the database was temporarily unavailable,
+    rather than because of the events written.
+
+    Parameters
+    ----------
+    error : Exception
+        The error of the failed write.
+
+    Returns
+    -------
+    bool
+        Whether retrying the same write later can succeed.
+    """
+    message = str(error)
+    return isinstance(error, OperationalError) and ('database is locked' in message or 'database is busy' in message)
+
+def _to_json(values):
+    """
+    Convert the column values of an event to JSON compatible values.
+
+    Parameters
+    ----------
+    values : dict
+        The column values of the event.
+
+    Returns
+    -------
+    dict
+        The column values with datetimes converted to ISO 8601 strings.
+    """
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in values.items()}
+
+def _from_json(table, values):
+    """
+    Convert the JSON values of a spilled event back to column values.
+
+    Parameters
+    ----------
+    table : str
+        The table name of the event.
+    values : dict
+        The JSON values of the event.
+
+    Returns
+    -------
+    dict
+        The column values with DateTime columns parsed back to datetimes.
+    """
+    columns = MODELS[table].__table__.columns
+    return {key: datetime.fromisoformat(value) if isinstance(columns[key].type, DateTime) and value is not None else value
+            for key, value in values.items()}
+
+class IngestBuffer:
+    """
+    A class used to buffer high-frequency tracker writes from many threads or
+    coroutines and commit them in batched transactions. A batch is flushed when
+    it reaches max_batch_size events or when its oldest event has waited
+    max_delay seconds.
+
+    If a batch fails because of some of its events, it is split in halves until
+    the failing events are isolated, so only their producers receive the error.
+    If it fails because the database is locked or busy, it is retried after
+    retry_delay seconds until it succeeds or the buffer is closed.
+
+    Every event is appended to a spill file when it is buffered, and an
+    acknowledgement is appended once its batch has been written, so events that
+    were buffered but not committed are replayed by start() after a crash, or
+    after a close() that gave up retrying. Events are delivered at least once: a
+    crash between a commit and its acknowledgement replays the committed events.
+    The background thread syncs the spill file once for all the events appended
+    since its last sync, so producers never wait on a sync per event.
+
+    Attributes
+    ----------
+    session_factory : sessionmaker
+        The factory used to open a session for each batch.
+    spill_path : str
+        The path of the append-only spill file.
+    max_batch_size : int
+        The maximum number of events written in one transaction.
+    max_delay : float
+        The maximum number of seconds an event waits before its batch is flushed.
+    fsync : bool
+        Whether the spill file is synced to disk, rather than only written to the
+        operating system. Without it, the spill file survives a crash of the process
+        but not of the operating system.
+    retry_delay : float
+        The number of seconds to wait before retrying a batch the database was too busy to write.
+    observers : list
+        The callables called with each committed record, e.g. ApproximateAnalytics.observe.
+    batches_committed : int
+        The number of batches committed so far.
+    syncs : int
+        The number of times the spill file was synced so far.
+    """
+    def __init__(self, session_factory=Session, spill_path='ingest_spill.log', max_batch_size=500, max_delay=0.05, fsync=True,
+                 retry_delay=0.1, observers=()):
+        self.session_factory = session_factory
+        self.spill_path = spill_path
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.fsync = fsync
+        self.retry_delay = retry_delay
+        self.observers = list(observers)
+        self.batches_committed = 0
+        self.syncs = 0
+        self._condition = threading.Condition()
+        self._pending = deque()
+        self._seq = 0
+        self._synced = 0
+        self._acked = 0
+        self._flushing = False
+        self._closed = False
+        self._stopped = False
+        self._thread = None
+        self._spill = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """
+        Replay any events left unacknowledged in the spill file and start the
+        background thread that flushes batches.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The number of events recovered from the spill file.
+        """
+        recovered = self._recover()
+        self._thread = threading.Thread(target=self._run, name='ingest-buffer', daemon=True)
+        self._thread.start()
+        return recovered
+
+    def submit(self, event, durable=False):
+        """
+        Buffer a new event for writing. Safe to call from any thread.
+
+        Parameters
+        ----------
+        event : HealthMetric, Workout, NutritionLog or SleepRecord
+            A new, unsaved record to insert.
+        durable : bool, optional
+            Whether to return only once the event is synced to the spill file, together
+            with the other events appended since the last sync. Default is False.
+
+        Returns
+        -------
+        Future
+            A future resolved with the event's sequence number once it is committed,
+            or with the exception that made it fail.
+        """
+        table = event.__tablename__
+        if table not in MODELS:
+            raise ValueError(f"Cannot ingest records of table {table}.")
+        values = {column.key: getattr(event, column.key) for column in event.__table__.columns
+                  if getattr(event, column.key) is not None}
+
+        future = Future()
+        with self._condition:
+            if self._thread is None or self._closed:
+                raise RuntimeError("Cannot submit events to an ingest buffer that is not running.")
+            self._seq += 1
+            self._append({'seq': self._seq, 'table': table, 'values': _to_json(values)})
+            self._pending.append(PendingEvent(self._seq, table, values, future, time.monotonic()))
+            self._condition.notify_all()
+            seq = self._seq
+            while durable and self._synced < seq and not self._stopped:
+                self._condition.wait()
+        return future
+
+    async def submit_async(self, event):
+        """
+        Buffer a new event for writing and wait for its acknowledgement from a coroutine.
+
+        Parameters
+        ----------
+        event : HealthMetric, Workout, NutritionLog or SleepRecord
+            A new, unsaved record to insert.
+
+        Returns
+        -------
+        int
+            The sequence number of the committed event.
+        """
+        return await asyncio.wrap_future(self.submit(event))
+
+    def flush(self):
+        """
+        Write every buffered event immediately and wait until they are acknowledged,
+        or until the buffer is closed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        with self._condition:
+            target = self._seq
+            self._flushing = True
+            self._condition.notify_all()
+            while self._acked < target and not self._stopped:
+                self._condition.wait()
+            self._flushing = False
+
+    def close(self):
+        """
+        Flush the remaining events, stop the background thread and close the spill file.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self._spill is not None:
+            # Events given up on are replayed from the spill file on the next start
+            self._sync()
+            self._spill.close()
+            self._spill = None
+
+    def _append(self, record):
+        # Appended in binary mode, whose buffered writer is safe to flush from the background thread
+        if self._spill is None:
+            self._spill = open(self.spill_path, 'ab')
+        self._spill.write(json.dumps(record).encode('utf-8') + b'\n')
+
+    def _sync(self):
+        """
+        Write the records appended to the spill file so far to the operating system
+        and, if fsync is set, to disk, outside of the lock so that producers keep
+        appending meanwhile. Wakes producers waiting for their events to be durable.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        with self._condition:
+            target = self._seq
+            spill = self._spill
+            if target <= self._synced or spill is None:
+                return
+        spill.flush()
+        if self.fsync:
+            os.fsync(spill.fileno())
+        with self._condition:
+            self._synced = max(self._synced, target)
+            self.syncs += 1
+            self._condition.notify_all()
+
+    def _recover(self):
+        if not os.path.exists(self.spill_path):
+            return 0
+
+        acked = 0
+        events = {}
+        with open(self.spill_path, encoding='utf-8') as spill:
+            for line in spill:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn write from a crash can only be the last line
+                    break
+                if 'ack' in record:
+                    acked = max(acked, record['ack'])
+                else:
+                    events[record['seq']] = record
+
+        unacked = [events[seq] for seq in sorted(events) if seq > acked]
+        # Compact into a new file replacing the spill file at once, so a crash while recovering loses nothing
+        compacted_path = self.spill_path + '.tmp'
+        with open(compacted_path, 'wb') as compacted:
+            for seq, record in enumerate(unacked, start=self._seq + 1):
+                compacted.write(json.dumps({'seq': seq, 'table': record['table'], 'values': record['values']}).encode('utf-8') + b'\n')
+            compacted.flush()
+            if self.fsync:
+                os.fsync(compacted.fileno())
+        os.replace(compacted_path, self.spill_path)
+        if self.fsync and hasattr(os, 'O_DIRECTORY'):
+            directory = os.open(os.path.dirname(os.path.abspath(self.spill_path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+        with self._condition:
+            if self._spill is not None:
+                self._spill.close()
+            self._spill = open(self.spill_path, 'ab')
+            for record in unacked:
+                self._seq += 1
+                self._pending.append(PendingEvent(self._seq, record['table'], _from_json(record['table'], record['values']),
+                                                  Future(), time.monotonic()))
+            self._synced = self._seq
+        return len(unacked)
+
+    def _run(self):
+        while True:
+            # Sync every event appended since the last cycle at once, before waiting for more
+            self._sync()
+            with self._condition:
+                if not self._pending:
+                    if self._closed:
+                        self._stop()
+                        return
+                    self._condition.wait()
+                    continue
+                remaining = self._pending[0].received + self.max_delay - time.monotonic()
+                if len(self._pending) < self.max_batch_size and not self._closed and not self._flushing and remaining > 0:
+                    if self._synced == self._seq:
+                        self._condition.wait(remaining)
+                    continue
+                batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch_size))]
+
+            results, transient = self._write(batch)
+            for event in batch:
+                if event.seq in results:
+                    if results[event.seq] is None:
+                        for observer in self.observers:
+                            observer(MODELS[event.table](**event.values))
+                        event.future.set_result(event.seq)
+                    else:
+                        event.future.set_exception(results[event.seq])
+            unresolved = [event for event in batch if event.seq not in results]
+
+            with self._condition:
+                if unresolved and self._closed:
+                    # Give up without acknowledging, so the spill file replays the events on the next start
+                    for event in unresolved + list(self._pending):
+                        event.future.set_exception(transient)
+                    self._pending.clear()
+                    self._stop()
+                    return
+                if unresolved:
+                    self._pending.extendleft(reversed(unresolved))
+                    self._condition.wait(self.retry_delay)
+                    continue
+                self._acked = batch[-1].seq
+                self._append({'ack': self._acked})
+                if not self._pending and self._acked == self._seq:
+                    # Everything spilled so far is acknowledged, so the spill file can be reset
+                    self._spill.truncate(0)
+                self._condition.notify_all()
+
+    def _stop(self):
+        self._stopped = True
+        self._condition.notify_all()
+
+    def _write(self, batch):
+        """
+        Write a batch, splitting it in halves while it fails so that only the events
+        causing the failure are rejected. Halves that were committed stay committed.
+
+        Parameters
+        ----------
+        batch : list
+            The pending events to write.
+
+        Returns
+        -------
+        tuple
+            A dict of the resolved events' sequence numbers to None if they were
+            committed or to the error that rejected them, and the transient error
+            that stopped the write before every event was resolved, or None.
+        """
+        results = {}
+        parts = [batch]
+        while parts:
+            events = parts.pop()
+            error = self._write_events(events)
+            if error is None:
+                results.update((event.seq, None) for event in events)
+            elif _is_transient(error):
+                return results, error
+            elif len(events) == 1:
+                results[events[0].seq] = error
+            else:
+                middle = len(events) // 2
+                parts.extend([events[middle:], events[:middle]])
+        return results, None
+
+    def _write_events(self, events):
+        rows_by_table = {}
+        for event in events:
+            rows_by_table.setdefault(event.table, []).append(event.values)
+
+        session = self.session_factory()
+        try:
+            for table, rows in rows_by_table.items():
+                # Group rows by their set of columns so each group is a single executemany
+                rows_by_columns = {}
+                for row in rows:
+                    rows_by_columns.setdefault(tuple(sorted(row)), []).append(row)
+                for group in rows_by_columns.values():
+                    session.execute(insert(MODELS[table]), group)
+            session.commit()
+            self.batches_committed += 1
+            return None
+        except Exception as e:
+            session.rollback()
+            return e
+        finally:
+            session.close()
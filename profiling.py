@@ -0,0 +1,279 @@
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import sqlalchemy
+from sqlalchemy import create_engine, make_url, select, insert, delete
+from sqlalchemy.orm import sessionmaker
+from schema import Base, Workout
+
+@dataclass(slots=True)
+class WorkoutRow:
+    """
+    A class used to hold a workout as a lightweight projection, without the ORM instance
+    state or the per-instance dict of a mapped Workout.
+
+    Attributes
+    ----------
+    id : int
+        The unique identifier for the workout.
+    user_id : int
+        The user that the workout belongs to.
+    date : datetime
+        The date of the workout.
+    type : str
+        The type of the workout.
+    duration_minutes : int
+        The duration of the workout in minutes.
+    calories_burned : int
+        The calories burned during the workout.
+    intensity : str
+        The intensity of the workout.
+    """
+    id: int
+    user_id: int
+    date: datetime
+    type: str
+    duration_minutes: int
+    calories_burned: int
+    intensity: str
+
+COLUMNS = [Workout.id, Workout.user_id, Workout.date, Workout.type, Workout.duration_minutes,
+           Workout.calories_burned, Workout.intensity]
+
+def _read_orm(session):
+    return session.query(Workout).all()
+
+def _read_columns(session):
+    return session.query(*COLUMNS).all()
+
+def _read_core(session):
+    return session.execute(select(*COLUMNS)).all()
+
+def _read_slots(session):
+    return [WorkoutRow(*row) for row in session.execute(select(*COLUMNS))]
+
+# Ways of loading the same workouts, from full ORM entities to slotted projections
+READERS = {
+    'orm': _read_orm,
+    'columns': _read_columns,
+    'core': _read_core,
+    'slots': _read_slots,
+}
+
+def _insert_orm(session, rows):
+    session.add_all([Workout(**row) for row in rows])
+    session.commit()
+
+def _insert_orm_bulk(session, rows):
+    session.execute(insert(Workout), rows)
+    session.commit()
+
+def _insert_core(session, rows):
+    session.connection().execute(insert(Workout.__table__), rows)
+    session.commit()
+
+def _insert_slots(session, rows):
+    connection = session.connection()
+    dialect = connection.dialect
+    compiled = insert(Workout.__table__).compile(dialect=dialect, column_keys=[key for key in rows[0] if key != 'id'])
+    # Parameters in the order of the compiled statement, with the conversions their types require
+    binds = [(name, compiled.binds[name].type.dialect_impl(dialect).bind_processor(dialect)) for name in compiled.positiontup]
+    records = [WorkoutRow(None, **row) for row in rows]
+    connection.connection.driver_connection.executemany(
+        compiled.string,
+        [tuple(processor(getattr(record, name)) if processor else getattr(record, name) for name, processor in binds)
+         for record in records]
+    )
+    session.commit()
+
+# Ways of inserting the same workouts
+INSERTERS = {
+    'orm': _insert_orm,
+    'orm_bulk': _insert_orm_bulk,
+    'core': _insert_core,
+    'slots': _insert_slots,
+}
+
+def generate_workouts(n, seed=0):
+    """
+    Generate reproducible workout rows.
+
+    Parameters
+    ----------
+    n : int
+        The number of rows.
+    seed : int, optional
+        The seed of the random generator. Default is 0.
+
+    Returns
+    -------
+    list
+        The rows as dicts of column values, in the order of WorkoutRow without the id.
+    """
+    generator = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [{
+        'user_id': generator.randint(1, 100),
+        'date': start + timedelta(minutes=generator.randint(0, 525600)),
+        'type': generator.choice(['Running', 'Cycling', 'Swimming', 'Yoga']),
+        'duration_minutes': generator.randint(10, 120),
+        'calories_burned': generator.randint(100, 1000),
+        'intensity': generator.choice(['Low', 'Medium', 'High']),
+    } for _ in range(n)]
+
+def _measure(function, repeat, setup=None):
+    """
+    Time a function, keeping the fastest of several runs, then run it once more under
+    tracemalloc to measure the memory it allocates.
+
+    Parameters
+    ----------
+    function : callable
+        The function measured. Its result is kept alive while memory is measured.
+    repeat : int
+        The number of timed runs.
+    setup : callable, optional
+        A function called before each run, outside of the measurement. Default is None.
+
+    Returns
+    -------
+    tuple
+        The fastest run in seconds, the bytes still allocated while the result is held,
+        and the peak bytes allocated during the run.
+    """
+    seconds = float('inf')
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        result = function()
+        seconds = min(seconds, time.perf_counter() - started)
+        del result
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = function()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return seconds, retained - baseline, peak - baseline
+
+def _result(operation, representation, rows, seconds, retained, peak):
+    return {
+        'operation': operation,
+        'representation': representation,
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds else None,
+        'bytes_per_row': retained / rows,
+        'peak_bytes_per_row': peak / rows,
+    }
+
+def run_benchmarks(url='sqlite:///:memory:', sizes=(1000, 10000, 100000), repeat=3, seed=0):
+    """
+    Measure the rows per second and bytes per row of reading and bulk inserting the
+    same workouts through full ORM entities, session.query() column tuples, Core
+    select() rows and slotted dataclass projections, at several sizes. For reads,
+    bytes per row is the memory held by the loaded result; for inserts, it is the
+    memory held once the insert is committed, and the peak is the memory allocated
+    while it runs.
+
+    Parameters
+    ----------
+    url : str, optional
+        The URL of the scratch database, either an in-memory SQLite database or a SQLite
+        file that does not exist yet, so that no existing data is touched. Default is an
+        in-memory database.
+    sizes : tuple, optional
+        The numbers of rows measured. Default is 1000, 10000 and 100000.
+    repeat : int, optional
+        The number of timed runs of each measurement, of which the fastest is kept. Default is 3.
+    seed : int, optional
+        The seed of the generated workouts. Default is 0.
+
+    Returns
+    -------
+    dict
+        The report, with the versions measured and one result per operation, representation and size.
+    """
+    database = make_url(url).database
+    if not url.startswith('sqlite') or (database not in (None, '', ':memory:') and os.path.exists(database)):
+        raise ValueError(f"Benchmarks only run on a new scratch database, not {url}.")
+    engine = create_engine(url)
+    Session = sessionmaker(bind=engine)
+    Base.metadata.create_all(engine)
+
+    def clear():
+        with engine.begin() as connection:
+            connection.execute(delete(Workout.__table__))
+
+    results = []
+    for size in sizes:
+        rows = generate_workouts(size, seed)
+        for representation, inserter in INSERTERS.items():
+            def run_insert():
+                session = Session()
+                try:
+                    inserter(session, rows)
+                finally:
+                    session.close()
+            results.append(_result('insert', representation, size, *_measure(run_insert, repeat, clear)))
+
+        for representation, reader in READERS.items():
+            def run_read():
+                session = Session()
+                try:
+                    return reader(session)
+                finally:
+                    session.close()
+            results.append(_result('read', representation, size, *_measure(run_read, repeat)))
+
+    engine.dispose()
+    return {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+def write_report(report, path='benchmark_report.json'):
+    """
+    Write a benchmark report as JSON, so that runs can be compared.
+
+    Parameters
+    ----------
+    report : dict
+        The report returned by run_benchmarks().
+    path : str, optional
+        The path of the report. Default is 'benchmark_report.json'.
+
+    Returns
+    -------
+    None
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+
+if __name__ == "__main__":
+    report = run_benchmarks()
+    write_report(report)
+    for result in report['results']:
+        print(f"{result['operation']:<6} {result['representation']:<8} {result['rows']:>7} rows: "
+              f"{result['rows_per_second']:>10.0f} rows/s, {result['bytes_per_row']:>6.0f} B/row, "
+              f"peak {result['peak_bytes_per_row']:>6.0f} B/row")
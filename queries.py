@@ -1,4 +1,4 @@
-from sqlalchemy import func, and_, desc, Index, extract
+from sqlalchemy import func, and_, desc, Index, extract, insert, update, bindparam
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime, timedelta
 from schema import engine, User, Workout, NutritionLog, SleepRecord, HealthMetric
@@ -7,6 +7,66 @@ from schema import engine, User, Workout, NutritionLog, SleepRecord, HealthMetri
 Session = sessionmaker(bind=engine)
 session = Session()
 
+def average_sleep_by_age_group(session):
+    """
+    Calculate the average sleep duration and quality for each 10-year age group.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    list
+        A list of (age_group, avg_duration, avg_quality) rows.
+    """
+    return session.query(
+        (func.floor(User.age / 10) * 10).label('age_group'),
+        func.avg(SleepRecord.duration_hours).label('avg_duration'),
+        func.avg(SleepRecord.quality).label('avg_quality')
+    ).join(SleepRecord).group_by('age_group').all()
+
+def most_common_workout_type(session):
+    """
+    Find the most frequently logged workout type across all users.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    Row or None
+        A (type, count) row, or None if there are no workouts.
+    """
+    return session.query(
+        Workout.type,
+        func.count(Workout.type).label('count')
+    ).group_by(Workout.type).order_by(func.count(Workout.type).desc()).first()
+
+def top_high_calorie_foods(session, limit=5):
+    """
+    Find the food items with the highest average calories logged.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    limit : int, optional
+        The number of food items to return. Default is 5.
+
+    Returns
+    -------
+    list
+        A list of (food_item, average_calories) rows.
+    """
+    return session.query(
+        NutritionLog.food_item,
+        func.avg(NutritionLog.calories).label('average_calories')
+    ).group_by(NutritionLog.food_item).order_by(func.avg(NutritionLog.calories).desc()).limit(limit).all()
+
 def run_queries():
     """
     Run a series of queries to analyze the data in the database and print the results.
@@ -23,7 +83,7 @@ def run_queries():
     total_calories = session.query(
         User.name,
         func.sum(Workout.calories_burned).label('total_calories')
-    ).join(Workout).group_by(User.name).all()
+    ).join(Workout).group_by(User.id).all()
 
     print("Total Calories Burned Per User:")
     if len(total_calories) == 0:
@@ -33,11 +93,7 @@ def run_queries():
             print(f"{user}: {calories} calories")
 
     # Average Sleep Duration and Quality by Age Group
-    average_sleep_by_age = session.query(
-        (func.floor(User.age / 10) * 10).label('age_group'),
-        func.avg(SleepRecord.duration_hours).label('avg_duration'),
-        func.avg(SleepRecord.quality).label('avg_quality')
-    ).join(SleepRecord).group_by('age_group').all()
+    average_sleep_by_age = average_sleep_by_age_group(session)
 
     print("\nAverage Sleep Duration and Quality by Age Group:")
     if len(average_sleep_by_age) == 0:
@@ -47,16 +103,13 @@ def run_queries():
             print(f"Age Group {age_group}s - Avg Duration: {round(duration, 2)} hours, Avg Quality: {round(quality, 2)}")
 
     # Most Common Workout Type
-    most_common_workout_type = session.query(
-        Workout.type,
-        func.count(Workout.type).label('count')
-    ).group_by(Workout.type).order_by(func.count(Workout.type).desc()).first()
+    most_common_workout = most_common_workout_type(session)
 
     print("\nMost Common Workout Type:")
-    if most_common_workout_type is None:
+    if most_common_workout is None:
         print("No workouts found in the database.")
     else:
-        print(f"{most_common_workout_type.type} - {most_common_workout_type.count} times")
+        print(f"{most_common_workout.type} - {most_common_workout.count} times")
 
     # User Progress Over Time (for a specific user)
     user_id_for_progress = 1
@@ -75,16 +128,13 @@ def run_queries():
             print(f"Date: {record.date}, Weight: {record.weight}, BMI: {record.bmi}")
 
     # Top 5 High Calorie Foods Logged
-    top_high_calorie_foods = session.query(
-        NutritionLog.food_item,
-        func.avg(NutritionLog.calories).label('average_calories')
-    ).group_by(NutritionLog.food_item).order_by(func.avg(NutritionLog.calories).desc()).limit(5).all()
+    top_foods = top_high_calorie_foods(session, 5)
 
     print("\nTop 5 High Calorie Foods Logged:")
-    if len(top_high_calorie_foods) == 0:
+    if len(top_foods) == 0:
         print("No nutrition logs found in the database.")
     else:
-        for food in top_high_calorie_foods:
+        for food in top_foods:
             print(f"Food: {food.food_item}, Avg Calories: {round(food.average_calories, 2)}")
 
     # Users Not Meeting Sleep Quality Goals
@@ -92,7 +142,7 @@ def run_queries():
     users_below_sleep_quality = session.query(
         User.name,
         func.avg(SleepRecord.quality).label('average_sleep_quality')
-    ).join(SleepRecord).group_by(User.name).having(func.avg(SleepRecord.quality) < sleep_quality_goal).all()
+    ).join(SleepRecord).group_by(User.id).having(func.avg(SleepRecord.quality) < sleep_quality_goal).all()
 
     print("\nUsers Not Meeting Sleep Quality Goals:")
     if len(users_below_sleep_quality) == 0:
@@ -120,7 +170,7 @@ def run_queries():
     average_daily_caloric_intake = session.query(
         User.name,
         func.avg(func.sum(NutritionLog.calories)).over(partition_by=NutritionLog.date).label('average_daily_calories')
-    ).join(NutritionLog).group_by(User.name).order_by('average_daily_calories').all()
+    ).join(NutritionLog).group_by(User.id).order_by('average_daily_calories').all()
 
     print("\nAverage Daily Caloric Intake Per User:")
     if len(average_daily_caloric_intake) == 0:
@@ -195,7 +245,7 @@ def run_queries():
         User.name,
         func.sum(SleepRecord.duration_hours).label('total_sleep_hours'),
         func.sum(Workout.duration_minutes / 60).label('total_workout_hours')
-    ).join(SleepRecord).join(Workout).filter(SleepRecord.date >= (datetime.now() - timedelta(days=30))).group_by(User.name).all()
+    ).join(SleepRecord).join(Workout).filter(SleepRecord.date >= (datetime.now() - timedelta(days=30))).group_by(User.id).all()
 
     print("\nTotal Sleep Hours vs Workout Hours Last Month:")
     if len(sleep_vs_workout_hours) == 0:
@@ -208,7 +258,7 @@ def run_queries():
     daily_calorie_goal = 2000
     users_achieving_calorie_goal = session.query(
         User.name
-    ).join(NutritionLog).group_by(User.name).having(func.sum(NutritionLog.calories) >= daily_calorie_goal).all()
+    ).join(NutritionLog).group_by(User.id).having(func.sum(NutritionLog.calories) >= daily_calorie_goal).all()
 
     print("\nUsers Achieving Calorie Intake Goal:")
     if len(users_achieving_calorie_goal) == 0:
@@ -318,6 +368,70 @@ def add_new_user_and_health_metrics():
         session.rollback()
         print(f"\nTransaction to add new user and initial health metrics failed: {e}")
 
+def apply_daily_corrections(session, corrections):
+    """
+    Apply many daily corrections in one batched transaction. Each correction updates
+    the user's workouts on a given day and adds nutrition logs for that day.
+
+    Workouts are matched on the half-open range [day, day + 1) so that the time of
+    day stored in Workout.date does not prevent a match, which lets the lookup use
+    the (user_id, date) index.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    corrections : iterable
+        (user_id, day, changes) tuples, where day is a date or datetime and changes
+        is a dict with an optional 'workout' dict of column updates and an optional
+        'nutrition_logs' list of dicts of nutrition log columns. Nutrition logs
+        without a date are logged at the start of the day.
+
+    Returns
+    -------
+    dict
+        The number of 'workouts_updated' and 'nutrition_logs_added'.
+    """
+    updates_by_columns = {}
+    logs_by_columns = {}
+    for user_id, day, changes in corrections:
+        if isinstance(day, datetime):
+            day = day.date()
+        start = datetime.combine(day, datetime.min.time())
+
+        workout_changes = changes.get('workout')
+        if workout_changes:
+            params = {'b_user_id': user_id, 'b_start': start, 'b_end': start + timedelta(days=1)}
+            params.update({f'b_{column}': value for column, value in workout_changes.items()})
+            updates_by_columns.setdefault(tuple(sorted(workout_changes)), []).append(params)
+
+        for log in changes.get('nutrition_logs', []):
+            row = {'user_id': user_id, 'date': start, **log}
+            logs_by_columns.setdefault(tuple(sorted(row)), []).append(row)
+
+    workouts_updated = 0
+    nutrition_logs_added = 0
+    try:
+        # Corrections changing the same columns share one executemany statement
+        workouts = Workout.__table__
+        for columns, params in updates_by_columns.items():
+            statement = update(workouts).where(
+                workouts.c.user_id == bindparam('b_user_id'),
+                workouts.c.date >= bindparam('b_start'),
+                workouts.c.date < bindparam('b_end')
+            ).values({column: bindparam(f'b_{column}') for column in columns})
+            workouts_updated += session.execute(statement, params).rowcount
+
+        for rows in logs_by_columns.values():
+            session.execute(insert(NutritionLog.__table__), rows)
+            nutrition_logs_added += len(rows)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return {'workouts_updated': workouts_updated, 'nutrition_logs_added': nutrition_logs_added}
+
 def update_user_workout_and_add_nutrition_log():
     """
     Update a user's workout and add a nutrition log for the same day.
@@ -333,13 +447,12 @@ def update_user_workout_and_add_nutrition_log():
     try:
         user_id = 1
         update_date = datetime.now().date()
-        session.query(Workout).filter(Workout.user_id == user_id, Workout.date == update_date).update({"type": "Yoga", "duration_minutes": 60})
-        new_nutrition_log = NutritionLog(user_id=user_id, date=update_date, meal_type="Breakfast", food_item="Oatmeal", quantity=2, calories=300)
-        session.add(new_nutrition_log)
-        session.commit()
+        apply_daily_corrections(session, [(user_id, update_date, {
+            'workout': {"type": "Yoga", "duration_minutes": 60},
+            'nutrition_logs': [{"meal_type": "Breakfast", "food_item": "Oatmeal", "quantity": 2, "calories": 300}]
+        })])
         print("\nUser's workout updated and nutrition log added for the same day successfully.")
     except Exception as e:
-        session.rollback()
         print(f"\nTransaction to update user's workout and add nutrition logs for the same day failed: {e}")
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+import gzip
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, delete, func, case
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import sessionmaker
+from schema import engine, migrate, SleepRecord, HealthMetric, DailySleepRecord, DailyHealthMetric
+
+# Connect to session
+Session = sessionmaker(bind=engine)
+session = Session()
+
+RetentionPolicy = namedtuple('RetentionPolicy', ['model', 'keep_days', 'summary_model', 'summaries'])
+RetentionPolicy.__doc__ = """
+How long the rows of a table are kept at full resolution. Older rows are summarized
+per user and day into summary_model, whose columns are given in summaries as
+{summary column: (raw column, 'mean' or 'sum')}, then archived and deleted. Each
+mean column is stored with the number of non-null values it averages, in the
+summary column named '{column}_samples'.
+"""
+
+POLICIES = [
+    RetentionPolicy(HealthMetric, 90, DailyHealthMetric, {
+        'weight': (HealthMetric.weight, 'mean'),
+        'bmi': (HealthMetric.bmi, 'mean'),
+        'heart_rate': (HealthMetric.heart_rate, 'mean'),
+    }),
+    RetentionPolicy(SleepRecord, 90, DailySleepRecord, {
+        'duration_hours': (SleepRecord.duration_hours, 'sum'),
+        'quality': (SleepRecord.quality, 'mean'),
+    }),
+]
+
+def _summarize(policy, ids):
+    """
+    Build the statement that adds the daily summaries of the given rows to the summary
+    table, merging them into summaries that already exist for the same user and day.
+
+    Parameters
+    ----------
+    policy : RetentionPolicy
+        The retention policy of the table.
+    ids : list
+        The ids of the rows to summarize.
+
+    Returns
+    -------
+    Insert
+        The summarizing statement.
+    """
+    model = policy.model
+    day = func.date(model.date)
+    means = [name for name, (_, how) in policy.summaries.items() if how == 'mean']
+    aggregates = [func.avg(column) if how == 'mean' else func.sum(column) for column, how in policy.summaries.values()]
+    counts = [func.count(policy.summaries[name][0]) for name in means]
+    rows = select(model.user_id, day, func.count(), *aggregates, *counts).where(model.id.in_(ids)).group_by(model.user_id, day)
+
+    columns = ['user_id', 'day', 'samples', *policy.summaries, *[f'{name}_samples' for name in means]]
+    statement = insert(policy.summary_model.__table__).from_select(columns, rows)
+    existing = policy.summary_model.__table__.c
+    new = statement.excluded
+    merged = {'samples': existing.samples + new.samples}
+    for name, (_, how) in policy.summaries.items():
+        if how == 'sum':
+            merged[name] = func.coalesce(existing[name] + new[name], existing[name], new[name])
+            continue
+        # Means are weighted by their non-null values; summaries without the count average every sample
+        existing_samples = func.coalesce(existing[f'{name}_samples'],
+                                         case((existing[name] == None, 0), else_=existing.samples))
+        new_samples = new[f'{name}_samples']
+        merged[name] = case(
+            (existing[name] == None, new[name]),
+            (new[name] == None, existing[name]),
+            else_=(existing[name] * existing_samples + new[name] * new_samples) / (existing_samples + new_samples)
+        )
+        merged[f'{name}_samples'] = existing_samples + new_samples
+    return statement.on_conflict_do_update(index_elements=['user_id', 'day'], set_=merged)
+
+def _to_json(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot archive value {value!r}.")
+
+def apply_retention(session, policy, now=None, archive_dir='archive', chunk_size=1000, pause=0.0):
+    """
+    Summarize, archive and delete the rows of a table that are older than its retention
+    period. Rows are processed in chunks, each in its own short transaction, so writers
+    are never locked out for long. Each chunk is appended to a gzip compressed JSON lines
+    archive before it is deleted, so a crash can at worst archive a chunk twice.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    policy : RetentionPolicy
+        The retention policy of the table.
+    now : datetime, optional
+        The current time. Default is the current time.
+    archive_dir : str, optional
+        The directory the archives are written to. Default is 'archive'.
+    chunk_size : int, optional
+        The number of rows processed per transaction. Default is 1000.
+    pause : float, optional
+        The number of seconds to wait between chunks. Default is 0.
+
+    Returns
+    -------
+    int
+        The number of rows archived and deleted.
+    """
+    now = now or datetime.now()
+    cutoff = datetime.combine((now - timedelta(days=policy.keep_days)).date(), datetime.min.time())
+    model = policy.model
+    os.makedirs(archive_dir, exist_ok=True)
+    archive_path = os.path.join(archive_dir, f'{model.__tablename__}-{now.strftime("%Y%m%dT%H%M%S")}.jsonl.gz')
+
+    archived = 0
+    while True:
+        ids = session.scalars(select(model.id).where(model.date < cutoff).order_by(model.id).limit(chunk_size)).all()
+        if not ids:
+            break
+
+        rows = session.execute(select(model.__table__).where(model.id.in_(ids))).mappings().all()
+        with gzip.open(archive_path, 'at', encoding='utf-8') as archive:
+            for row in rows:
+                archive.write(json.dumps(dict(row), default=_to_json) + '\n')
+
+        try:
+            session.execute(_summarize(policy, ids))
+            session.execute(delete(model).where(model.id.in_(ids)), execution_options={'synchronize_session': False})
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        archived += len(ids)
+        if pause:
+            time.sleep(pause)
+    return archived
+
+def enable_incremental_vacuum(engine):
+    """
+    Switch the database to incremental auto-vacuum, so that space freed by deletes can be
+    reclaimed in small steps. Switching an existing database requires one full VACUUM.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+
+    Returns
+    -------
+    bool
+        Whether the database was switched, False if it already used incremental auto-vacuum.
+    """
+    with engine.connect() as connection:
+        if connection.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2:
+            return False
+        connection.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        connection.exec_driver_sql('VACUUM')
+    return True
+
+def reclaim_space(engine, pages_per_step=1000, pause=0.0):
+    """
+    Return free pages to the file system with incremental vacuum steps. This does nothing
+    unless the database uses incremental auto-vacuum, see enable_incremental_vacuum().
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+    pages_per_step : int, optional
+        The number of pages freed per step. Default is 1000.
+    pause : float, optional
+        The number of seconds to wait between steps. Default is 0.
+
+    Returns
+    -------
+    int
+        The number of pages freed.
+    """
+    freed = 0
+    with engine.connect() as connection:
+        if connection.exec_driver_sql('PRAGMA auto_vacuum').scalar() != 2:
+            return 0
+        while True:
+            free_pages = connection.exec_driver_sql('PRAGMA freelist_count').scalar()
+            if free_pages == 0:
+                break
+            connection.exec_driver_sql(f'PRAGMA incremental_vacuum({int(pages_per_step)})')
+            connection.commit()
+            step = free_pages - connection.exec_driver_sql('PRAGMA freelist_count').scalar()
+            if step <= 0:
+                break
+            freed += step
+            if pause:
+                time.sleep(pause)
+    return freed
+
+def run_retention(session, policies=POLICIES, now=None, archive_dir='archive', chunk_size=1000, pause=0.0):
+    """
+    Migrate the database, so that the summary tables have every column, apply every
+    retention policy, then reclaim the space freed.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    policies : list, optional
+        The retention policies to apply. Default is POLICIES.
+    now : datetime, optional
+        The current time. Default is the current time.
+    archive_dir : str, optional
+        The directory the archives are written to. Default is 'archive'.
+    chunk_size : int, optional
+        The number of rows processed per transaction. Default is 1000.
+    pause : float, optional
+        The number of seconds to wait between chunks. Default is 0.
+
+    Returns
+    -------
+    dict
+        The number of rows archived per table, and the number of 'pages_freed'.
+    """
+    migrate(session.get_bind())
+    results = {}
+    for policy in policies:
+        results[policy.model.__tablename__] = apply_retention(session, policy, now, archive_dir, chunk_size, pause)
+    session.close()
+    results['pages_freed'] = reclaim_space(session.get_bind(), pause=pause)
+    return results
+
+if __name__ == "__main__":
+    for name, count in run_retention(session).items():
+        print(f"{name}: {count}")
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -111,6 +112,7 @@ class Workout(Base):
     intensity = Column(String)
     calories_burned = Column(Float)
     user = relationship('User', back_populates='workouts')
+    __table_args__ = (Index('idx_workout_user_date', 'user_id', 'date'),)
 
 class NutritionLog(Base):
     """
@@ -149,6 +151,7 @@ class NutritionLog(Base):
     quantity = Column(Float, nullable=False)
     calories = Column(Float, nullable=False)
     user = relationship('User', back_populates='nutrition_logs')
+    __table_args__ = (Index('idx_nutrition_log_user_date', 'user_id', 'date'),)
 
 class SleepRecord(Base):
     """
@@ -180,6 +183,7 @@ class SleepRecord(Base):
     duration_hours = Column(Float, nullable=False)
     quality = Column(String, nullable=False)
     user = relationship('User', back_populates='sleep_records')
+    __table_args__ = (Index('idx_sleep_record_user_date', 'user_id', 'date'),)
 
 class HealthMetric(Base):
     """
@@ -217,9 +221,246 @@ class HealthMetric(Base):
     heart_rate = Column(Integer)
     blood_pressure = Column(String)
     user = relationship('User', back_populates='health_metrics')
+    __table_args__ = (Index('idx_health_metric_user_date', 'user_id', 'date'),)
+
+class DailyHealthMetric(Base):
+    """
+    A class used to represent the daily summary of a user's health metrics, which replaces
+    the individual health metrics once they are older than the retention period.
+
+    Attributes
+    ----------
+    user_id : int
+        The ID of the user associated with the summary.
+    day : date
+        The day summarized.
+    weight : float
+        The average weight of the user on the day.
+    bmi : float
+        The average body mass index of the user on the day.
+    heart_rate : float
+        The average heart rate of the user on the day.
+    samples : int
+        The number of health metrics summarized.
+    weight_samples : int
+        The number of summarized health metrics with a weight, None for summaries
+        written before it was recorded.
+    bmi_samples : int
+        The number of summarized health metrics with a body mass index, None for
+        summaries written before it was recorded.
+    heart_rate_samples : int
+        The number of summarized health metrics with a heart rate, None for summaries
+        written before it was recorded.
+    """
+    __tablename__ = 'daily_health_metrics'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    weight = Column(Float)
+    bmi = Column(Float)
+    heart_rate = Column(Float)
+    samples = Column(Integer, nullable=False)
+    weight_samples = Column(Integer)
+    bmi_samples = Column(Integer)
+    heart_rate_samples = Column(Integer)
+
+class DailySleepRecord(Base):
+    """
+    A class used to represent the daily summary of a user's sleep records, which replaces
+    the individual sleep records once they are older than the retention period.
+
+    Attributes
+    ----------
+    user_id : int
+        The ID of the user associated with the summary.
+    day : date
+        The day summarized.
+    duration_hours : float
+        The total duration of the sleep in hours on the day.
+    quality : float
+        The average quality rating of the sleep on the day.
+    samples : int
+        The number of sleep records summarized.
+    quality_samples : int
+        The number of summarized sleep records with a quality rating, None for
+        summaries written before it was recorded.
+    """
+    __tablename__ = 'daily_sleep_records'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    duration_hours = Column(Float, nullable=False)
+    quality = Column(Float)
+    samples = Column(Integer, nullable=False)
+    quality_samples = Column(Integer)
+
+class GoalProgress(Base):
+    """
+    A class used to represent the latest progress snapshot of a goal. The goal's free-text
+    target is parsed into a structured threshold on a metric, which is evaluated against
+    the user's workouts, nutrition logs, sleep records or health metrics.
+
+    Attributes
+    ----------
+    goal_id : int
+        The foreign key referencing the goal, which is also the primary key.
+    user_id : int
+        The foreign key referencing the user that the goal belongs to.
+    goal_type : str
+        The type of the goal when it was parsed.
+    target : str
+        The target of the goal when it was parsed.
+    metric : str
+        The metric the target was parsed into, or None if the target could not be parsed.
+    comparison : str
+        Whether the metric must be 'at_least' or 'at_most' the threshold.
+    threshold : float
+        The threshold value of the metric.
+    period_days : int
+        The number of days of data the metric is evaluated over.
+    value : float
+        The value of the metric at the last evaluation.
+    achieved : bool
+        Whether the threshold was met at the last evaluation.
+    evaluated_at : datetime
+        The time of the last evaluation, or None if the goal has not been evaluated.
+
+    Relationships
+    -------------
+    goal : Goal
+        The goal that the progress belongs to.
+    """
+    __tablename__ = 'goal_progress'
+    goal_id = Column(Integer, ForeignKey('goals.id'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    goal_type = Column(String, nullable=False)
+    target = Column(String, nullable=False)
+    metric = Column(String)
+    comparison = Column(String)
+    threshold = Column(Float)
+    period_days = Column(Integer)
+    value = Column(Float)
+    achieved = Column(Boolean)
+    evaluated_at = Column(DateTime)
+    goal = relationship('Goal')
+
+class GoalWatermark(Base):
+    """
+    A class used to represent how far goal progress has been evaluated through a table,
+    so that later evaluations only revisit users with newer rows.
+
+    Attributes
+    ----------
+    table_name : str
+        The name of the table, which is also the primary key.
+    last_id : int
+        The largest id in the table covered by the last evaluation.
+    """
+    __tablename__ = 'goal_watermarks'
+    table_name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False)
+
+class ChangeLog(Base):
+    """
+    A class used to represent an entry of the change data capture log. Every insert, update
+    and delete on the tracked tables appends one entry, see cdc.py.
+
+    Attributes
+    ----------
+    seq : int
+        The sequence number of the change, which increases monotonically and is never reused.
+    table_name : str
+        The name of the table that changed.
+    operation : str
+        The kind of change: 'insert', 'update' or 'delete'.
+    row_id : int
+        The id of the row that changed.
+    data : str
+        The row after the change as a JSON object, or the deleted row for deletes.
+    changed_at : datetime
+        The local time of the change.
+    """
+    __tablename__ = 'change_log'
+    seq = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    operation = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    data = Column(String)
+    changed_at = Column(DateTime, nullable=False)
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class ChangeCheckpoint(Base):
+    """
+    A class used to represent how far a consumer has read the change data capture log.
+
+    Attributes
+    ----------
+    consumer : str
+        The name of the consumer, which is also the primary key.
+    last_seq : int
+        The sequence number of the last change the consumer has processed.
+    """
+    __tablename__ = 'change_checkpoints'
+    consumer = Column(String, primary_key=True)
+    last_seq = Column(Integer, nullable=False)
+
+class FoodItem(Base):
+    """
+    A class used to represent a distinct food item logged in nutrition logs, indexed
+    for search by search.py.
+
+    Attributes
+    ----------
+    id : int
+        The unique identifier for the food item.
+    name : str
+        The name of the food item as logged.
+    entries : int
+        The number of nutrition logs of the food item.
+    """
+    __tablename__ = 'food_items'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    entries = Column(Integer, nullable=False, default=0)
+
+def migrate(engine):
+    """
+    Bring an existing database up to date with the models, creating missing tables and
+    indexes, and adding columns added to tables that already exist. Only nullable
+    columns without a unique constraint can be added, as existing rows have no value
+    for them.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+
+    Returns
+    -------
+    None
+    """
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                unique = column.unique or any(isinstance(constraint, UniqueConstraint) and column.name in constraint.columns
+                                              for constraint in table.constraints)
+                if not column.nullable or column.primary_key or unique:
+                    raise RuntimeError(f"Cannot add column {column.name} to existing table {table.name}, "
+                                       f"as it is not nullable or is unique.")
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(connection)}'))
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(connection)
 
 # Create an engine that stores data in the local directory's database
 engine = create_engine('sqlite:///health_and_fitness_tracking.db')
 
 # Create all tables in the engine
-Base.metadata.create_all(engine)
\ No newline at end of file
+Base.metadata.create_all(engine)
+
+if __name__ == "__main__":
+    migrate(engine)
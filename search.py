@@ -0,0 +1,407 @@
+import re
+import time
+import unicodedata
+from collections import namedtuple
+from difflib import SequenceMatcher
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from schema import engine, Base, User, NutritionLog, FoodItem
+
+# Connect to session
+Session = sessionmaker(bind=engine)
+session = Session()
+
+SearchIndex = namedtuple('SearchIndex', ['table', 'columns', 'result_columns', 'prefix_table', 'trigram_table'])
+SearchIndex.__doc__ = """
+The full-text indexes of a table. prefix_table is an FTS5 table tokenized into words
+with prefix indexes, for ranked autocomplete. trigram_table is an FTS5 table tokenized
+into trigrams, for typo-tolerant matching. Both are external content tables that read
+the indexed columns from table and are kept in sync with it by triggers.
+"""
+
+INDEXES = {
+    'foods': SearchIndex(FoodItem.__tablename__, ['name'], ['id', 'name', 'entries'], 'food_search', 'food_trigrams'),
+    'users': SearchIndex(User.__tablename__, ['name', 'email'], ['id', 'name', 'email'], 'user_search', 'user_trigrams'),
+}
+
+# Create the FTS5 tables of an index
+_CREATE = {
+    'prefix_table': "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', "
+                    "content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+    'trigram_table': "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', "
+                     "content_rowid='id', tokenize='trigram')",
+}
+
+def _create_triggers(connection, index):
+    """
+    Create the triggers that keep the FTS5 tables of an index in sync with its table.
+
+    Parameters
+    ----------
+    connection : Connection
+        The connection to the database.
+    index : SearchIndex
+        The search index.
+
+    Returns
+    -------
+    None
+    """
+    columns = ', '.join(index.columns)
+    new = ', '.join(f'NEW.{column}' for column in index.columns)
+    old = ', '.join(f'OLD.{column}' for column in index.columns)
+    for fts in (index.prefix_table, index.trigram_table):
+        insert_new = f"INSERT INTO {fts} (rowid, {columns}) VALUES (NEW.id, {new});"
+        delete_old = f"INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES ('delete', OLD.id, {old});"
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {index.table} BEGIN {insert_new} END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {index.table} BEGIN {delete_old} END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {columns} ON {index.table} "
+            f"BEGIN {delete_old} {insert_new} END"
+        )
+
+def install_search(engine):
+    """
+    Create the search indexes of food items and users, with the triggers that keep them
+    in sync, and fill them from the existing rows. The food dictionary in food_items is
+    rebuilt from the nutrition logs, and triggers add the food items of new nutrition
+    logs to it. Entries are not decremented when nutrition logs are deleted.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+
+    Returns
+    -------
+    None
+    """
+    food_item = f"INSERT INTO {FoodItem.__tablename__} (name, entries) VALUES (NEW.food_item, 1) " \
+                f"ON CONFLICT (name) DO UPDATE SET entries = entries + 1;"
+    FoodItem.__table__.create(engine, checkfirst=True)
+    with engine.begin() as connection:
+        for index in INDEXES.values():
+            for kind, create in _CREATE.items():
+                connection.exec_driver_sql(create.format(fts=getattr(index, kind), columns=', '.join(index.columns), table=index.table))
+
+        connection.exec_driver_sql(f"DELETE FROM {FoodItem.__tablename__}")
+        connection.exec_driver_sql(
+            f"INSERT INTO {FoodItem.__tablename__} (name, entries) SELECT food_item, count(*) "
+            f"FROM {NutritionLog.__tablename__} WHERE food_item IS NOT NULL GROUP BY food_item"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS food_items_insert AFTER INSERT ON {NutritionLog.__tablename__} "
+            f"WHEN NEW.food_item IS NOT NULL BEGIN {food_item} END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS food_items_update AFTER UPDATE OF food_item ON {NutritionLog.__tablename__} "
+            f"WHEN NEW.food_item IS NOT NULL BEGIN {food_item} END"
+        )
+
+        for index in INDEXES.values():
+            _create_triggers(connection, index)
+            for fts in (index.prefix_table, index.trigram_table):
+                connection.exec_driver_sql(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def _words(value):
+    """
+    Split a value into lowercased words without diacritics, as the unicode61 tokenizer does.
+
+    Parameters
+    ----------
+    value : str
+        The value to split.
+
+    Returns
+    -------
+    list
+        The words of the value.
+    """
+    value = (value or '').lower()
+    if not value.isascii():
+        value = ''.join(char for char in unicodedata.normalize('NFKD', value) if not unicodedata.combining(char))
+    return re.findall(r'[^\W_]+', value)
+
+def _trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+def _similarity(matcher, value, threshold=0.0):
+    """
+    Score how closely a value matches a query, as the best match of the query against
+    the whole value or any of its words.
+
+    Parameters
+    ----------
+    matcher : SequenceMatcher
+        A matcher whose second sequence is the lowercased query.
+    value : str
+        The indexed value.
+    threshold : float, optional
+        The similarity below which scores need not be exact, as they are discarded. Default is 0.
+
+    Returns
+    -------
+    float
+        The similarity, from 0 to 1, or 0 if it is below the threshold.
+    """
+    value = (value or '').lower()
+    best = 0.0
+    for candidate in [value] + re.findall(r'\w+', value):
+        matcher.set_seq1(candidate)
+        # Cheap upper bounds rule out most candidates before the full comparison
+        if matcher.real_quick_ratio() > max(best, threshold) and matcher.quick_ratio() > max(best, threshold):
+            best = max(best, matcher.ratio())
+    return best if best >= threshold else 0.0
+
+def _match(session, index, fts, match, scan_limit):
+    """
+    Fetch the rows of an index's table matching a full-text query. At most scan_limit
+    matches are read, in rowid order, and FTS5's bm25 rank is not computed, as it
+    reads the whole index entry of every common word in the query.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    index : SearchIndex
+        The search index.
+    fts : str
+        The name of the FTS5 table queried.
+    match : str
+        The FTS5 query.
+    scan_limit : int
+        The maximum number of matches read.
+
+    Returns
+    -------
+    list
+        The matching rows as tuples of the index's result columns.
+    """
+    columns = ', '.join(f'{index.table}.{column}' for column in index.result_columns)
+    return [tuple(row) for row in session.execute(text(
+        f"SELECT {columns} FROM (SELECT rowid FROM {fts} WHERE {fts} MATCH :match LIMIT :scan_limit) AS matched "
+        f"JOIN {index.table} ON {index.table}.id = matched.rowid"
+    ), {'match': match, 'scan_limit': scan_limit})]
+
+def search(session, name, query, limit=10, fuzzy=True, min_similarity=0.7, strong_similarity=0.8,
+           scan_limit=200, max_trigram_rows=500):
+    """
+    Search an index for rows whose words start with the words of the query. Words of
+    the query that are followed by more text match whole words, unless they have at
+    most three letters, and the last word matches as a prefix. Rows matching whole
+    words of the query rank first, then shorter rows.
+
+    If there are fewer than limit such rows and none of them is a strong match, rows
+    that match the query with typos are added. They are found by the trigrams they share
+    with the query, ignoring trigrams too common to narrow the search, or by the first
+    two letters of the query's words, and ranked by similarity.
+
+    Each full-text query reads at most scan_limit matches, so searches take about the
+    same time whatever the size of the table, at the cost of ranking only those matches.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    name : str
+        The name of the index, one of INDEXES.
+    query : str
+        The text typed by the user.
+    limit : int, optional
+        The maximum number of results. Default is 10.
+    fuzzy : bool, optional
+        Whether typo-tolerant matches are added. Default is True.
+    min_similarity : float, optional
+        The minimum similarity of typo-tolerant matches, from 0 to 1. Default is 0.7.
+    strong_similarity : float, optional
+        The similarity of a prefix match from which no typo-tolerant matches are
+        added, from 0 to 1. Default is 0.8.
+    scan_limit : int, optional
+        The maximum number of matches read per full-text query. Default is 200.
+    max_trigram_rows : int, optional
+        The number of rows above which a trigram is too common to find typo-tolerant
+        matches with. Default is 500.
+
+    Returns
+    -------
+    list
+        The matching rows as tuples of the index's result columns, best matches first.
+    """
+    if name not in INDEXES:
+        raise ValueError(f"Unknown search index {name}.")
+    index = INDEXES[name]
+    positions = [index.result_columns.index(column) for column in index.columns]
+    words = _words(query)
+    if not words:
+        return []
+
+    terms = []
+    for position, word in enumerate(words):
+        if len(word) <= 3:
+            # Served by the FTS5 prefix indexes of up to three letters
+            terms.append(_quote(word) + '*')
+        elif position < len(words) - 1:
+            terms.append(_quote(word))
+        elif len(words) > 1:
+            # Longer prefixes scan every word they expand to, so narrow with the indexed prefix and check below
+            terms.append(_quote(word[:3]) + '*')
+        else:
+            terms.append(_quote(word) + '*')
+
+    results = []
+    for row in _match(session, index, index.prefix_table, ' '.join(terms), scan_limit):
+        row_words = [word for position in positions for word in _words(row[position])]
+        if all(any(row_word.startswith(word) for row_word in row_words) for word in words):
+            exact = sum(word in row_words for word in words)
+            results.append((-exact, sum(len(row[position] or '') for position in positions), row[0], row))
+    results = [row for *_, row in sorted(results)[:limit]]
+
+    normalized = ' '.join(words)
+    trigrams = _trigrams(normalized)
+    if not fuzzy or len(results) >= limit or not trigrams:
+        return results
+    matcher = SequenceMatcher(None, '', normalized)
+    if any(_similarity(matcher, row[position], strong_similarity) for row in results for position in positions):
+        return results
+
+    # Trigrams shared by more than max_trigram_rows rows, such as those of a common email domain, are ignored
+    rare = []
+    for trigram in sorted(trigrams):
+        rows = session.execute(text(
+            f"SELECT count(*) FROM (SELECT 1 FROM {index.trigram_table} WHERE {index.trigram_table} MATCH :match "
+            f"LIMIT :limit)"
+        ), {'match': _quote(trigram), 'limit': max_trigram_rows + 1}).scalar()
+        if rows <= max_trigram_rows:
+            rare.append(trigram)
+
+    candidates = {}
+    if rare:
+        for row in _match(session, index, index.trigram_table, ' OR '.join(_quote(trigram) for trigram in rare), scan_limit):
+            candidates.setdefault(row[0], row)
+    # Word prefixes catch typos that break every trigram of a short word
+    for row in _match(session, index, index.prefix_table, ' '.join(_quote(word[:2]) + '*' for word in words), scan_limit):
+        candidates.setdefault(row[0], row)
+
+    # Only the candidates sharing the most trigrams with the query are compared in full
+    found = {row[0] for row in results}
+    shared = []
+    for row in candidates.values():
+        if row[0] not in found:
+            row_trigrams = set().union(*(_trigrams(' '.join(_words(row[position]))) for position in positions))
+            shared.append((len(trigrams & row_trigrams), row))
+    shared.sort(key=lambda item: item[0], reverse=True)
+
+    scored = []
+    for _, row in shared[:limit * 5]:
+        similarity = max(_similarity(matcher, row[position], min_similarity) for position in positions)
+        if similarity >= min_similarity:
+            scored.append((similarity, row))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return results + [row for _, row in scored[:limit - len(results)]]
+
+def search_foods(session, query, limit=10, fuzzy=True):
+    """
+    Search the food dictionary, e.g. for autocomplete when logging a meal.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    query : str
+        The text typed by the user.
+    limit : int, optional
+        The maximum number of results. Default is 10.
+    fuzzy : bool, optional
+        Whether typo-tolerant matches are added. Default is True.
+
+    Returns
+    -------
+    list
+        (id, name, entries) tuples of the matching food items, best matches first.
+    """
+    return search(session, 'foods', query, limit, fuzzy)
+
+def search_users(session, query, limit=10, fuzzy=True):
+    """
+    Search users by name and email address.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    query : str
+        The text typed by the user.
+    limit : int, optional
+        The maximum number of results. Default is 10.
+    fuzzy : bool, optional
+        Whether typo-tolerant matches are added. Default is True.
+
+    Returns
+    -------
+    list
+        (id, name, email) tuples of the matching users, best matches first.
+    """
+    return search(session, 'users', query, limit, fuzzy)
+
+# Autocomplete queries timed by benchmark_search(): exact, prefix and misspelled
+BENCHMARK_QUERIES = ['user12345@example.com', 'user123', 'maria gar', 'john', 'j', 'jonh', 'davd brwn']
+
+def benchmark_search(users=100000, queries=BENCHMARK_QUERIES, repeat=5):
+    """
+    Measure the latency of user searches over a scratch in-memory database of generated
+    users, keeping the fastest of several runs of each query.
+
+    Parameters
+    ----------
+    users : int, optional
+        The number of users generated. Default is 100000.
+    queries : list, optional
+        The queries timed. Default is BENCHMARK_QUERIES.
+    repeat : int, optional
+        The number of timed runs of each query. Default is 5.
+
+    Returns
+    -------
+    dict
+        The fastest latency of each query in milliseconds.
+    """
+    scratch = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(scratch)
+    first_names = ['John', 'Jane', 'Maria', 'David', 'Laura', 'Pat', 'Alex', 'Sam']
+    last_names = ['Smith', 'Jones', 'Garcia', 'Brown', 'Lee', 'Lopez', 'Miller', 'Davis']
+    with scratch.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {'name': f'{first_names[i % 8]} {last_names[i // 8 % 8]}{i % 97}', 'email': f'user{i}@example.com',
+             'age': 18 + i % 48, 'gender': 'Other'}
+            for i in range(users)
+        ])
+    install_search(scratch)
+
+    session = sessionmaker(bind=scratch)()
+    latencies = {}
+    try:
+        for query in queries:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                search_users(session, query)
+                timings.append((time.perf_counter() - started) * 1000)
+            latencies[query] = min(timings)
+    finally:
+        session.close()
+        scratch.dispose()
+    return latencies
+
+if __name__ == "__main__":
+    install_search(engine)
+    for food_id, name, entries in search_foods(session, 'chick'):
+        print(f"{name} ({entries} entries)")
+    for query, latency in benchmark_search().items():
+        print(f"{query!r}: {latency:.2f}ms")
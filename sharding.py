@@ -0,0 +1,309 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, MetaData, Table, Column, String, Integer, insert, update
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User
+from analytics import METRICS, run_analytics
+
+# Table allocating user ids across shards, kept in the first shard
+sequence_metadata = MetaData()
+user_id_sequence = Table(
+    'user_id_sequence', sequence_metadata,
+    Column('name', String, primary_key=True),
+    Column('next_id', Integer, nullable=False)
+)
+
+class ShardedDatabase:
+    """
+    A class used to spread users over several database files, each with its own write lock,
+    so that write throughput scales with the number of shards. Each user is routed to a
+    shard by a hash of their id, and all of the user's workouts, nutrition logs, sleep
+    records, health metrics and goals are stored in the same shard.
+
+    User ids are allocated from a sequence in the first shard so they are unique across
+    shards. Email uniqueness is only enforced within a shard.
+
+    Attributes
+    ----------
+    engines : list
+        The engine of each shard.
+    sessionmakers : list
+        The session factory of each shard.
+    """
+    def __init__(self, urls, max_workers=None):
+        self.engines = [create_engine(url) for url in urls]
+        self.sessionmakers = [sessionmaker(bind=shard_engine) for shard_engine in self.engines]
+        for shard_engine in self.engines:
+            Base.metadata.create_all(shard_engine)
+        sequence_metadata.create_all(self.engines[0])
+        self._executor = ThreadPoolExecutor(max_workers or len(urls))
+
+    def close(self):
+        """
+        Stop the worker threads and dispose of the shard engines.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        self._executor.shutdown()
+        for shard_engine in self.engines:
+            shard_engine.dispose()
+
+    def shard_for(self, user_id):
+        """
+        Find the shard of a user.
+
+        Parameters
+        ----------
+        user_id : int
+            The id of the user.
+
+        Returns
+        -------
+        int
+            The index of the user's shard.
+        """
+        return zlib.crc32(str(user_id).encode('utf-8')) % len(self.engines)
+
+    def session_for(self, user_id):
+        """
+        Open a session on the shard of a user, for per-user queries.
+
+        Parameters
+        ----------
+        user_id : int
+            The id of the user.
+
+        Returns
+        -------
+        SQLAlchemy session
+            A session on the user's shard. The session should be closed after use.
+        """
+        return self.sessionmakers[self.shard_for(user_id)]()
+
+    def allocate_user_ids(self, n=1):
+        """
+        Allocate new user ids that are unique across all shards.
+
+        Parameters
+        ----------
+        n : int, optional
+            The number of ids to allocate. Default is 1.
+
+        Returns
+        -------
+        list
+            The allocated ids.
+        """
+        with self.engines[0].begin() as connection:
+            connection.execute(insert(user_id_sequence).prefix_with('OR IGNORE').values(name='users', next_id=1))
+            next_id = connection.execute(
+                update(user_id_sequence).where(user_id_sequence.c.name == 'users')
+                .values(next_id=user_id_sequence.c.next_id + n).returning(user_id_sequence.c.next_id)
+            ).scalar()
+        return list(range(next_id - n, next_id))
+
+    def write(self, records):
+        """
+        Write records to their users' shards, with one transaction per shard, committed
+        on all shards in parallel. New users without an id are allocated one first.
+
+        Parameters
+        ----------
+        records : list
+            User, Goal, Workout, NutritionLog, SleepRecord and HealthMetric records.
+
+        Returns
+        -------
+        list
+            The number of records written to each shard.
+        """
+        new_users = [record for record in records if isinstance(record, User) and record.id is None]
+        for user, user_id in zip(new_users, self.allocate_user_ids(len(new_users)) if new_users else []):
+            user.id = user_id
+
+        records_by_shard = [[] for _ in self.engines]
+        for record in records:
+            user_id = record.id if isinstance(record, User) else record.user_id
+            if user_id is None:
+                raise ValueError(f"Cannot route a {type(record).__name__} without a user.")
+            records_by_shard[self.shard_for(user_id)].append(record)
+
+        def write_shard(shard, shard_records):
+            if not shard_records:
+                return 0
+            session = self.sessionmakers[shard](expire_on_commit=False)
+            try:
+                session.add_all(shard_records)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+            return len(shard_records)
+
+        futures = [self._executor.submit(write_shard, shard, shard_records)
+                   for shard, shard_records in enumerate(records_by_shard)]
+        return [future.result() for future in futures]
+
+    def scatter(self, function, *args, **kwargs):
+        """
+        Run a function against every shard in parallel.
+
+        Parameters
+        ----------
+        function : callable
+            A function taking a session as its first argument, e.g. a report from queries.py.
+        *args, **kwargs
+            Further arguments passed to the function.
+
+        Returns
+        -------
+        list
+            The result of the function on each shard.
+        """
+        def run(sessionmaker_):
+            session = sessionmaker_()
+            try:
+                return function(session, *args, **kwargs)
+            finally:
+                session.close()
+
+        futures = [self._executor.submit(run, sessionmaker_) for sessionmaker_ in self.sessionmakers]
+        return [future.result() for future in futures]
+
+    def gather_analytics(self, metric, dimensions=(), filters=None, aggregate=None, start=None, end=None):
+        """
+        Run an analytics query on every shard in parallel and merge the partial aggregates,
+        see analytics.run_analytics(). Averages are merged from per-shard sums and counts.
+
+        Parameters
+        ----------
+        metric : str
+            The name of the metric.
+        dimensions : list, optional
+            The names of the dimensions to group by. Default is no grouping.
+        filters : dict, optional
+            Values to filter dimensions on. Default is no filters.
+        aggregate : str, optional
+            The aggregate of the metric. Default is the metric's default aggregate.
+        start : datetime, optional
+            The first date included. Default is no lower bound.
+        end : datetime, optional
+            The date before which rows are included. Default is no upper bound.
+
+        Returns
+        -------
+        list
+            Tuples of the dimension values followed by the metric value, ordered by the dimensions.
+        """
+        aggregate = aggregate or METRICS[metric].aggregate
+
+        def partials(partial_aggregate):
+            merged = {}
+            for rows in self.scatter(run_analytics, metric, dimensions, filters, partial_aggregate, start, end):
+                for row in rows:
+                    key, value = tuple(row[:-1]), row[-1]
+                    if value is None:
+                        continue
+                    if key not in merged:
+                        merged[key] = value
+                    elif partial_aggregate in ('sum', 'count'):
+                        merged[key] += value
+                    else:
+                        merged[key] = min(merged[key], value) if partial_aggregate == 'min' else max(merged[key], value)
+            return merged
+
+        if aggregate == 'avg':
+            sums, counts = partials('sum'), partials('count')
+            merged = {key: sums[key] / counts[key] for key in sums if counts.get(key)}
+        else:
+            merged = partials(aggregate)
+        if not dimensions and not merged:
+            merged = {(): 0 if aggregate == 'count' else None}
+        return [(*key, value) for key, value in sorted(merged.items(), key=lambda item: item[0])]
+
+def total_calories_burned_per_user(database):
+    """
+    Calculate the total calories burned by each user across all shards.
+
+    Parameters
+    ----------
+    database : ShardedDatabase
+        The sharded database.
+
+    Returns
+    -------
+    list
+        (user_id, total_calories) tuples ordered by user id.
+    """
+    return database.gather_analytics('calories_burned', ['user'])
+
+def average_sleep_by_age_group(database):
+    """
+    Calculate the average sleep duration and quality for each 10-year age group across all shards.
+
+    Parameters
+    ----------
+    database : ShardedDatabase
+        The sharded database.
+
+    Returns
+    -------
+    list
+        (age_group, avg_duration, avg_quality) tuples ordered by age group.
+    """
+    durations = dict(database.gather_analytics('sleep_hours', ['age_bucket']))
+    qualities = dict(database.gather_analytics('sleep_quality', ['age_bucket']))
+    return [(age_group, durations[age_group], qualities.get(age_group)) for age_group in sorted(durations)]
+
+def most_common_workout_type(database):
+    """
+    Find the most frequently logged workout type across all shards.
+
+    Parameters
+    ----------
+    database : ShardedDatabase
+        The sharded database.
+
+    Returns
+    -------
+    tuple or None
+        The (type, count) of the most common workout type, or None if there are no workouts.
+    """
+    counts = database.gather_analytics('workouts', ['workout_type'])
+    return max(counts, key=lambda row: row[1]) if counts else None
+
+def top_high_calorie_foods(database, limit=5):
+    """
+    Find the food items with the highest average calories logged across all shards.
+
+    Parameters
+    ----------
+    database : ShardedDatabase
+        The sharded database.
+    limit : int, optional
+        The number of food items to return. Default is 5.
+
+    Returns
+    -------
+    list
+        (food_item, average_calories) tuples, highest average first.
+    """
+    averages = database.gather_analytics('intake', ['food_item'], aggregate='avg')
+    return sorted(averages, key=lambda row: row[1], reverse=True)[:limit]
+
+if __name__ == "__main__":
+    database = ShardedDatabase([f'sqlite:///shard-{index}.db' for index in range(4)])
+    for age_group, avg_duration, avg_quality in average_sleep_by_age_group(database):
+        print(f"Age Group {age_group}s - Avg Sleep: {round(avg_duration, 2)} hours, Avg Quality: {round(avg_quality, 2)}")
+    print(f"Most Common Workout Type: {most_common_workout_type(database)}")
+    for food_item, average_calories in top_high_calorie_foods(database):
+        print(f"{food_item}: {round(average_calories, 2)} calories")
+    database.close()
@@ -0,0 +1,262 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from schema import engine
+
+SNAPSHOT_NAME = re.compile(r'^snapshot-(\d{8}T\d{12})\.db$')
+SNAPSHOT_TIME_FORMAT = '%Y%m%dT%H%M%S%f'
+
+Snapshot = namedtuple('Snapshot', ['path', 'created_at'])
+
+ReportResult = namedtuple('ReportResult', ['rows', 'snapshot_path', 'snapshot_created_at', 'staleness'])
+ReportResult.__doc__ = """
+The result of a report served from a snapshot, with the snapshot it was read from and
+how old that snapshot was when the report ran.
+"""
+
+def create_snapshot(source_engine, path, method='backup', pages=1024):
+    """
+    Write a consistent copy of a SQLite database to a new file.
+
+    Parameters
+    ----------
+    source_engine : Engine
+        The engine of the database to copy.
+    path : str
+        The path of the copy. The copy is written to a temporary file and moved into
+        place once complete, so readers never see a partial copy.
+    method : str, optional
+        'backup' to use the SQLite online backup API, copying the given number of pages
+        per step so writers are not blocked for the whole copy, or 'vacuum' to use
+        VACUUM INTO, which also defragments the copy. Default is 'backup'.
+    pages : int, optional
+        The number of pages copied per backup step. Default is 1024.
+
+    Returns
+    -------
+    None
+    """
+    partial_path = f'{path}.partial'
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    connection = source_engine.raw_connection()
+    try:
+        source = connection.driver_connection
+        if method == 'backup':
+            target = sqlite3.connect(partial_path)
+            try:
+                source.backup(target, pages=pages)
+            finally:
+                target.close()
+        elif method == 'vacuum':
+            source.execute('VACUUM INTO ?', (partial_path,))
+        else:
+            raise ValueError(f"Unknown snapshot method {method}.")
+    finally:
+        connection.close()
+    os.replace(partial_path, path)
+
+class SnapshotManager:
+    """
+    A class used to serve reports from periodically refreshed read-only snapshots of
+    the database, so long aggregate scans do not compete with writes for locks.
+
+    Snapshots are opened read-only and immutable, so SQLite skips locking and change
+    detection entirely, with a large memory map for scans.
+
+    Attributes
+    ----------
+    source_engine : Engine
+        The engine of the live database.
+    snapshot_dir : str
+        The directory the snapshots are written to.
+    refresh_interval : float
+        The number of seconds between snapshots taken by the background thread.
+    keep : int
+        The number of snapshots kept. Older ones are deleted after each refresh.
+    mmap_size : int
+        The number of bytes of each snapshot memory mapped by readers.
+    method : str
+        The method used to copy the database, 'backup' or 'vacuum'.
+    """
+    def __init__(self, source_engine=engine, snapshot_dir='snapshots', refresh_interval=300, keep=2,
+                 mmap_size=1 << 30, method='backup'):
+        self.source_engine = source_engine
+        self.snapshot_dir = snapshot_dir
+        self.refresh_interval = refresh_interval
+        self.keep = keep
+        self.mmap_size = mmap_size
+        self.method = method
+        self._lock = threading.Lock()
+        self._engines = {}
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+    def snapshots(self):
+        """
+        List the complete snapshots in the snapshot directory.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        list
+            The snapshots, oldest first.
+        """
+        snapshots = []
+        for name in os.listdir(self.snapshot_dir):
+            match = SNAPSHOT_NAME.match(name)
+            if match:
+                created_at = datetime.strptime(match.group(1), SNAPSHOT_TIME_FORMAT)
+                snapshots.append(Snapshot(os.path.join(self.snapshot_dir, name), created_at))
+        return sorted(snapshots, key=lambda snapshot: snapshot.created_at)
+
+    def latest(self):
+        """
+        Return the newest snapshot.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Snapshot or None
+            The newest snapshot, or None if no snapshot has been taken.
+        """
+        snapshots = self.snapshots()
+        return snapshots[-1] if snapshots else None
+
+    def refresh(self):
+        """
+        Take a new snapshot of the live database and delete snapshots beyond the number kept.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Snapshot
+            The new snapshot.
+        """
+        created_at = datetime.now()
+        path = os.path.join(self.snapshot_dir, f'snapshot-{created_at.strftime(SNAPSHOT_TIME_FORMAT)}.db')
+        create_snapshot(self.source_engine, path, self.method)
+
+        with self._lock:
+            for old in self.snapshots()[:-self.keep]:
+                old_engine = self._engines.pop(old.path, None)
+                if old_engine is not None:
+                    old_engine.dispose()
+                # Readers that still have the file open keep reading it until they close
+                os.remove(old.path)
+        return Snapshot(path, created_at)
+
+    def start(self):
+        """
+        Take a snapshot if none exists and start a background thread that takes a new
+        snapshot every refresh_interval seconds.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self.latest() is None:
+            self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='snapshot-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background refresh thread and dispose of the snapshot engines.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            for snapshot_engine in self._engines.values():
+                snapshot_engine.dispose()
+            self._engines.clear()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def _engine(self, path):
+        with self._lock:
+            snapshot_engine = self._engines.get(path)
+            if snapshot_engine is None:
+                snapshot_engine = create_engine(f'sqlite:///file:{os.path.abspath(path)}?mode=ro&immutable=1&uri=true')
+                mmap_size = self.mmap_size
+
+                @event.listens_for(snapshot_engine, 'connect')
+                def configure(dbapi_connection, connection_record):
+                    dbapi_connection.execute(f'PRAGMA mmap_size={int(mmap_size)}')
+
+                self._engines[path] = snapshot_engine
+            return snapshot_engine
+
+    def session(self):
+        """
+        Open a read-only session on the newest snapshot.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        tuple
+            The (session, snapshot) pair. The session should be closed after use.
+        """
+        snapshot = self.latest()
+        if snapshot is None:
+            raise RuntimeError("No snapshot has been taken yet.")
+        return sessionmaker(bind=self._engine(snapshot.path))(), snapshot
+
+    def run_report(self, report, *args, **kwargs):
+        """
+        Run a report against the newest snapshot.
+
+        Parameters
+        ----------
+        report : callable
+            A report taking a session as its first argument, e.g. from queries.py.
+        *args, **kwargs
+            Further arguments passed to the report.
+
+        Returns
+        -------
+        ReportResult
+            The rows returned by the report and the staleness of the snapshot.
+        """
+        session, snapshot = self.session()
+        try:
+            rows = report(session, *args, **kwargs)
+        finally:
+            session.close()
+        return ReportResult(rows, snapshot.path, snapshot.created_at, datetime.now() - snapshot.created_at)
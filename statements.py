@@ -0,0 +1,263 @@
+import timeit
+from sqlalchemy import select, func, bindparam
+from sqlalchemy.orm import sessionmaker
+from schema import engine, User, Workout, SleepRecord, HealthMetric
+
+# Connect to session
+Session = sessionmaker(bind=engine)
+session = Session()
+
+class PreparedQuery:
+    """
+    A class used to run a hot statement without rebuilding or recompiling it on every
+    call. The statement is built once with bound parameters, compiled once per dialect,
+    and executed directly on the DBAPI connection of the session, returning plain
+    tuples with only the column conversions that the column types require.
+
+    Attributes
+    ----------
+    statement : Select
+        The statement, with bindparam() placeholders for its per-call values.
+    """
+    def __init__(self, statement):
+        self.statement = statement
+        self._prepared = {}
+
+    def _prepare(self, dialect):
+        prepared = self._prepared.get(dialect.name)
+        if prepared is None:
+            compiled = self.statement.compile(dialect=dialect)
+            binds = []
+            for name in compiled.positiontup:
+                bind = compiled.binds[name]
+                binds.append((name, bind.value, bind.type.dialect_impl(dialect).bind_processor(dialect)))
+            processors = [(index, column.type.dialect_impl(dialect).result_processor(dialect, None))
+                          for index, column in enumerate(self.statement.selected_columns)]
+            processors = [(index, processor) for index, processor in processors if processor is not None]
+            prepared = self._prepared[dialect.name] = (compiled.string, binds, processors)
+        return prepared
+
+    def all(self, session, **params):
+        """
+        Execute the statement in the session's transaction. Unlike session.query(), this
+        does not autoflush, so pending changes must be flushed to be seen.
+
+        Parameters
+        ----------
+        session : SQLAlchemy session
+            The session object used to interact with the database.
+        **params
+            The values of the statement's bound parameters.
+
+        Returns
+        -------
+        list
+            The result rows as tuples.
+        """
+        connection = session.connection()
+        sql, binds, processors = self._prepare(connection.dialect)
+        values = []
+        for name, default, processor in binds:
+            value = params.get(name, default)
+            values.append(processor(value) if processor else value)
+
+        rows = connection.connection.driver_connection.execute(sql, values).fetchall()
+        if not processors:
+            return rows
+        converted = []
+        for row in rows:
+            row = list(row)
+            for index, processor in processors:
+                row[index] = processor(row[index])
+            converted.append(tuple(row))
+        return converted
+
+    def first(self, session, **params):
+        """
+        Execute the statement in the session's transaction and return its first row.
+
+        Parameters
+        ----------
+        session : SQLAlchemy session
+            The session object used to interact with the database.
+        **params
+            The values of the statement's bound parameters.
+
+        Returns
+        -------
+        tuple or None
+            The first result row, or None if there are no rows.
+        """
+        rows = self.all(session, **params)
+        return rows[0] if rows else None
+
+USER_BY_ID = PreparedQuery(
+    select(User.id, User.name, User.email, User.age, User.gender).where(User.id == bindparam('user_id'))
+)
+
+USER_BY_EMAIL = PreparedQuery(
+    select(User.id, User.name, User.email, User.age, User.gender).where(User.email == bindparam('email'))
+)
+
+USER_PROGRESS = PreparedQuery(
+    select(HealthMetric.date, HealthMetric.weight, HealthMetric.bmi).where(
+        HealthMetric.user_id == bindparam('user_id')
+    ).order_by(HealthMetric.date)
+)
+
+WORKOUT_FREQUENCY = PreparedQuery(
+    select(Workout.type, func.count(Workout.type).label('frequency')).where(
+        Workout.user_id == bindparam('user_id')
+    ).group_by(Workout.type)
+)
+
+LATEST_SLEEP = PreparedQuery(
+    select(SleepRecord.date, SleepRecord.duration_hours, SleepRecord.quality).where(
+        SleepRecord.user_id == bindparam('user_id')
+    ).order_by(SleepRecord.date.desc()).limit(1)
+)
+
+def get_user(session, user_id):
+    """
+    Look up a user by id.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    user_id : int
+        The id of the user.
+
+    Returns
+    -------
+    tuple or None
+        The (id, name, email, age, gender) of the user, or None if there is no such user.
+    """
+    return USER_BY_ID.first(session, user_id=user_id)
+
+def find_user_by_email(session, email):
+    """
+    Look up a user by email address.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    email : str
+        The email address of the user.
+
+    Returns
+    -------
+    tuple or None
+        The (id, name, email, age, gender) of the user, or None if there is no such user.
+    """
+    return USER_BY_EMAIL.first(session, email=email)
+
+def user_progress(session, user_id):
+    """
+    Get a user's weight and BMI over time.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    user_id : int
+        The id of the user.
+
+    Returns
+    -------
+    list
+        (date, weight, bmi) tuples ordered by date.
+    """
+    return USER_PROGRESS.all(session, user_id=user_id)
+
+def workout_frequency(session, user_id):
+    """
+    Count how often a user performed each workout type.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    user_id : int
+        The id of the user.
+
+    Returns
+    -------
+    list
+        (type, frequency) tuples.
+    """
+    return WORKOUT_FREQUENCY.all(session, user_id=user_id)
+
+def latest_sleep(session, user_id):
+    """
+    Get a user's most recent sleep record.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    user_id : int
+        The id of the user.
+
+    Returns
+    -------
+    tuple or None
+        The (date, duration_hours, quality) of the latest sleep record, or None if there is none.
+    """
+    return LATEST_SLEEP.first(session, user_id=user_id)
+
+def benchmark(session, user_id=1, number=2000):
+    """
+    Measure the per-call time of the prepared lookups against the same lookups built
+    with session.query() on every call, as in queries.py.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    user_id : int, optional
+        The id of the user to look up. Default is 1.
+    number : int, optional
+        The number of calls timed for each lookup. Default is 2000.
+
+    Returns
+    -------
+    dict
+        For each lookup, the microseconds per call of the 'orm' and 'prepared' versions.
+    """
+    lookups = {
+        'user_progress': (
+            lambda: session.query(HealthMetric.date, HealthMetric.weight, HealthMetric.bmi).filter(
+                HealthMetric.user_id == user_id).order_by(HealthMetric.date).all(),
+            lambda: user_progress(session, user_id)
+        ),
+        'workout_frequency': (
+            lambda: session.query(Workout.type, func.count(Workout.type).label('frequency')).filter(
+                Workout.user_id == user_id).group_by(Workout.type).all(),
+            lambda: workout_frequency(session, user_id)
+        ),
+        'latest_sleep': (
+            lambda: session.query(SleepRecord.date, SleepRecord.duration_hours, SleepRecord.quality).filter(
+                SleepRecord.user_id == user_id).order_by(SleepRecord.date.desc()).first(),
+            lambda: latest_sleep(session, user_id)
+        ),
+        'get_user': (
+            lambda: session.query(User).filter(User.id == user_id).first(),
+            lambda: get_user(session, user_id)
+        ),
+    }
+
+    results = {}
+    for name, (orm_lookup, prepared_lookup) in lookups.items():
+        results[name] = {
+            'orm': timeit.timeit(orm_lookup, number=number) / number * 1e6,
+            'prepared': timeit.timeit(prepared_lookup, number=number) / number * 1e6,
+        }
+    return results
+
+if __name__ == "__main__":
+    for name, timings in benchmark(session).items():
+        saved = timings['orm'] - timings['prepared']
+        print(f"{name}: ORM {timings['orm']:.1f} us/call, Prepared {timings['prepared']:.1f} us/call, "
+              f"Saved {saved:.1f} us/call ({saved / timings['orm']:.0%})")
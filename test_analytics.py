@@ -0,0 +1,115 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, Workout, NutritionLog, SleepRecord
+from analytics import build_query, run_analytics
+
+# Setup a fixture for the database session
+@pytest.fixture(scope="module")
+def session():
+    """
+    Create a new database session with three users, two of them sharing a name, and
+    their records, and return it to the test function. After the test is run, the
+    session is closed.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+    session.add_all([
+        User(id=1, name='Alex Smith', email='alex1@example.com', age=34, gender='Female'),
+        User(id=2, name='Alex Smith', email='alex2@example.com', age=38, gender='Male'),
+        User(id=3, name='Sam Jones', email='sam@example.com', age=52, gender='Female'),
+        Workout(user_id=1, date=datetime(2024, 1, 5, 7), type='Running', duration_minutes=30, calories_burned=300),
+        Workout(user_id=1, date=datetime(2024, 2, 5, 7), type='Yoga', duration_minutes=60, calories_burned=200),
+        Workout(user_id=2, date=datetime(2024, 1, 6, 7), type='Running', duration_minutes=45, calories_burned=450),
+        Workout(user_id=3, date=datetime(2024, 2, 7, 7), type='Running', duration_minutes=20, calories_burned=250),
+        SleepRecord(user_id=1, date=datetime(2024, 1, 5), duration_hours=7, quality='3'),
+        SleepRecord(user_id=2, date=datetime(2024, 1, 5), duration_hours=9, quality='5'),
+        SleepRecord(user_id=3, date=datetime(2024, 1, 5), duration_hours=6, quality='2'),
+        NutritionLog(user_id=3, date=datetime(2024, 1, 5, 8), meal_type='Breakfast', food_item='Oatmeal', quantity=1, calories=150),
+        NutritionLog(user_id=3, date=datetime(2024, 1, 5, 13), meal_type='Lunch', food_item='Pasta', quantity=1, calories=600),
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+# Test grouping by dimensions
+def test_run_analytics_groups_by_dimensions(session):
+    """
+    Test that metrics are aggregated per user id, cohort and time bucket.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    assert run_analytics(session, 'calories_burned', ['user']) == [(1, 500), (2, 450), (3, 250)]
+    assert run_analytics(session, 'calories_burned') == [(1200,)]
+    assert run_analytics(session, 'sleep_hours', ['age_bucket']) == [(30, 8), (50, 6)]
+    assert run_analytics(session, 'sleep_quality', ['age_bucket', 'gender']) == [(30, 'Female', 3), (30, 'Male', 5), (50, 'Female', 2)]
+    assert run_analytics(session, 'workouts', ['month', 'workout_type']) == [
+        ('2024-01', 'Running', 2), ('2024-02', 'Running', 1), ('2024-02', 'Yoga', 1)]
+    assert run_analytics(session, 'intake', ['day']) == [('2024-01-05', 750)]
+    assert run_analytics(session, 'workout_minutes', ['user'], aggregate='max') == [(1, 60), (2, 45), (3, 20)]
+
+# Test filters
+def test_run_analytics_filters(session):
+    """
+    Test that filters on dimensions and dates restrict the rows aggregated, and that
+    queries of the same shape share one prepared statement.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    assert run_analytics(session, 'calories_burned', ['workout_type'], filters={'gender': 'Female'}) == [('Running', 550), ('Yoga', 200)]
+    assert run_analytics(session, 'calories_burned', ['workout_type'], filters={'gender': 'Male'}) == [('Running', 450)]
+    assert run_analytics(session, 'calories_burned', ['user'], filters={'age_bucket': ('>=', 40)}) == [(3, 250)]
+    assert run_analytics(session, 'workouts', ['user'], filters={'user': 1},
+                         start=datetime(2024, 2, 1), end=datetime(2024, 3, 1)) == [(1, 1)]
+    assert build_query('calories_burned', ('workout_type',), (('gender', '=='),)) is \
+        build_query('calories_burned', ('workout_type',), (('gender', '=='),))
+
+    with pytest.raises(ValueError):
+        run_analytics(session, 'sleep_hours', ['workout_type'])
+    with pytest.raises(ValueError):
+        run_analytics(session, 'steps')
+
+# Test that per-user queries use the (user_id, date) index
+def test_run_analytics_uses_user_date_index(session):
+    """
+    Test that a per-user query over a date range is served by the (user_id, date) index.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    statement = build_query('sleep_hours', ('day',), (('user', '=='),), None, True, True).statement
+    compiled = statement.compile(session.get_bind())
+    plan = session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled.string}', (1, '2024-01-01', '2024-02-01')).all()
+    assert 'idx_sleep_record_user_date' in ' '.join(row[-1] for row in plan)
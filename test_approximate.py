@@ -0,0 +1,163 @@
+import random
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, func, union
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, Workout, NutritionLog, SleepRecord, HealthMetric
+from queries import average_sleep_by_age_group, most_common_workout_type, top_high_calorie_foods
+from approximate import ApproximateAnalytics, CountMinSketch, HyperLogLog, ReservoirSample
+
+# Setup a fixture for a populated database session
+@pytest.fixture(scope="module")
+def session():
+    """
+    Create a new database session populated with seeded sample data and return it
+    to the test function. After the test is run, the session is closed.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    users = [User(name=f'User {i}', email=f'user{i}@example.com', age=rng.randint(18, 65),
+                  gender=rng.choice(['Male', 'Female', 'Other'])) for i in range(200)]
+    session.add_all(users)
+    session.flush()
+    for _ in range(3000):
+        session.add(Workout(user_id=rng.choice(users).id, date=start + timedelta(hours=rng.randint(0, 5000)),
+                            type=rng.choices(['Running', 'Cycling', 'Swimming', 'Gym', 'Yoga'], [5, 3, 2, 2, 1])[0],
+                            duration_minutes=rng.randint(15, 120), intensity='Medium',
+                            calories_burned=rng.randint(100, 1000)))
+        session.add(NutritionLog(user_id=rng.choice(users).id, date=start + timedelta(hours=rng.randint(0, 5000)),
+                                 meal_type='Lunch', food_item=rng.choice(['Pasta', 'Rice', 'Salmon', 'Broccoli',
+                                                                          'Beef Steak', 'Greek Yogurt', 'Protein Shake']),
+                                 quantity=1, calories=rng.randint(50, 700)))
+        session.add(SleepRecord(user_id=rng.choice(users).id, date=start + timedelta(hours=rng.randint(0, 5000)),
+                                duration_hours=round(rng.uniform(4.0, 12.0), 2), quality=rng.randint(1, 5)))
+    session.add(HealthMetric(user_id=users[-1].id, date=start, weight=70, bmi=22, heart_rate=70, blood_pressure='120/80'))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+# Test sketches against the exact queries
+def test_approximate_matches_exact_queries(session):
+    """
+    Test that the approximate reports built from a sample smaller than the tables
+    match the exact reports in queries.py within their error bounds.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    analytics = ApproximateAnalytics(sample_size=1500, seed=7)
+    analytics.load(session)
+
+    exact_workout = most_common_workout_type(session)
+    workout_type, count = analytics.most_common_workout_type()
+    assert workout_type == exact_workout.type
+    assert count.value - count.error <= exact_workout.count <= count.value
+
+    estimated_foods = dict(analytics.top_high_calorie_foods(limit=10))
+    for food in top_high_calorie_foods(session, 5):
+        estimate = estimated_foods[food.food_item]
+        assert abs(estimate.value - food.average_calories) <= estimate.error
+
+    estimated_sleep = {group: (duration, quality) for group, duration, quality in analytics.average_sleep_by_age_group(session)}
+    for age_group, avg_duration, avg_quality in average_sleep_by_age_group(session):
+        duration, quality = estimated_sleep[age_group]
+        assert abs(duration.value - avg_duration) <= duration.error
+        assert abs(quality.value - avg_quality) <= quality.error
+
+    active_users = session.query(func.count()).select_from(union(
+        session.query(Workout.user_id), session.query(NutritionLog.user_id),
+        session.query(SleepRecord.user_id), session.query(HealthMetric.user_id)).subquery()).scalar()
+    distinct_users = analytics.distinct_active_users()
+    assert abs(distinct_users.value - active_users) <= distinct_users.error
+
+# Test the sketches maintained on ingest
+def test_track_observes_committed_records():
+    """
+    Test that tracking a session observes committed records and ignores records
+    from rolled back transactions.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1, name='Test User', email='test@example.com', age=30, gender='Male'))
+    session.commit()
+
+    analytics = ApproximateAnalytics()
+    analytics.track(session)
+    try:
+        session.add(Workout(user_id=1, date=datetime.now(), type='Rowing', duration_minutes=30, calories_burned=300))
+        session.flush()
+        session.rollback()
+        assert analytics.workout_types.total == 0
+
+        session.add(Workout(user_id=1, date=datetime.now(), type='Rowing', duration_minutes=30, calories_burned=300))
+        session.commit()
+        assert analytics.workout_types.estimate('Rowing').value == 1
+        assert analytics.most_common_workout_type()[0] == 'Rowing'
+    finally:
+        session.close()
+        engine.dispose()
+
+# Test the individual sketches
+def test_sketch_bounds():
+    """
+    Test the error bounds of the reservoir sample, Count-Min sketch and HyperLogLog.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    sample = ReservoirSample(capacity=100, seed=1)
+    for i in range(50):
+        sample.add(i)
+    assert sorted(sample.items) == list(range(50))
+    assert sample.correction() == 0.0
+    for i in range(50, 1000):
+        sample.add(i)
+    assert len(sample.items) == 100
+    assert 0.0 < sample.correction() < 1.0
+
+    sketch = CountMinSketch(width=64, depth=4)
+    for i in range(1000):
+        sketch.add(i % 100)
+    for item in range(100):
+        estimate = sketch.estimate(item)
+        assert estimate.value - estimate.error <= 10 <= estimate.value
+
+    hll = HyperLogLog(precision=10)
+    for i in range(20000):
+        hll.add(i % 5000)
+    estimate = hll.estimate()
+    assert abs(estimate.value - 5000) <= estimate.error
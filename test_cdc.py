@@ -0,0 +1,144 @@
+import time
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, Goal, Workout, ChangeLog
+from cdc import install_triggers, uninstall_triggers, read_changes, get_checkpoint, consume, prune_changes
+
+# Setup a fixture for the database session
+@pytest.fixture
+def session():
+    """
+    Create a new database session with the change capture triggers installed, and
+    return it to the test function. After the test is run, the session is closed.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    install_triggers(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+    yield session
+    session.close()
+    engine.dispose()
+
+# Test that changes are captured
+def test_changes_are_captured_in_order(session):
+    """
+    Test that inserts, updates and deletes made through the ORM and Core are captured in
+    sequence order with the changed row, and rolled back changes are not. Deleting the
+    user also captures the update that detaches its workout.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    user = User(name='Test User', email='test@example.com', age=30, gender='Male')
+    session.add(user)
+    session.commit()
+    session.execute(insert(Workout), [{'user_id': user.id, 'date': datetime(2024, 1, 1), 'type': 'Running', 'duration_minutes': 30}])
+    session.execute(update(Workout).values(duration_minutes=45))
+    session.commit()
+    session.add(Goal(user_id=user.id, goal_type='Fitness', target='Run 3 times a week'))
+    session.rollback()
+    session.delete(user)
+    session.commit()
+
+    changes = read_changes(session)
+    assert [(change.seq, change.table_name, change.operation) for change in changes] == [
+        (1, 'users', 'insert'), (2, 'workouts', 'insert'), (3, 'workouts', 'update'),
+        (4, 'workouts', 'update'), (5, 'users', 'delete')]
+    assert changes[0].data == {'id': 1, 'name': 'Test User', 'email': 'test@example.com', 'age': 30, 'gender': 'Male'}
+    assert changes[2].data['duration_minutes'] == 45
+    assert changes[2].row_id == 1
+    assert changes[3].data['user_id'] is None
+    assert isinstance(changes[4].changed_at, datetime)
+    assert [change.seq for change in read_changes(session, after=2, tables=['workouts'])] == [3, 4]
+
+    uninstall_triggers(session.get_bind())
+    session.add(User(name='Other User', email='other@example.com'))
+    session.commit()
+    assert len(read_changes(session)) == 5
+
+# Test change timestamps
+def test_changes_are_timestamped_in_local_time(session, monkeypatch):
+    """
+    Test that changes are timestamped in local time, like the rest of the database,
+    rather than in UTC.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    monkeypatch : MonkeyPatch
+        Used to set a time zone away from UTC.
+
+    Returns
+    -------
+    None
+    """
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    try:
+        session.add(User(name='Test User', email='test@example.com', age=30, gender='Male'))
+        session.commit()
+        changed_at = read_changes(session)[0].changed_at
+        assert abs(changed_at - datetime.now()) < timedelta(minutes=1)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+# Test consumers reading from checkpoints
+def test_consumers_read_batches_from_checkpoints(session):
+    """
+    Test that consumers read batches after their own checkpoints, that a failing handler
+    gets the batch again, and that changes every consumer has processed are pruned.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    session.add_all([User(name=f'User {i}', email=f'user{i}@example.com') for i in range(5)])
+    session.commit()
+
+    batches = []
+    assert consume(session, 'search', batches.append, limit=2) == 2
+    assert consume(session, 'search', batches.append, limit=2) == 2
+    assert [[change.row_id for change in batch] for batch in batches] == [[1, 2], [3, 4]]
+    assert get_checkpoint(session, 'search') == 4
+
+    def fail(changes):
+        raise RuntimeError("Warehouse unavailable")
+    with pytest.raises(RuntimeError):
+        consume(session, 'warehouse', fail)
+    assert get_checkpoint(session, 'warehouse') == 0
+    assert consume(session, 'warehouse', batches.append) == 5
+    assert consume(session, 'warehouse', batches.append) == 0
+
+    assert prune_changes(session) == 4
+    assert [change.seq for change in read_changes(session)] == [5]
+
+    # Sequence numbers are never reused after pruning
+    session.query(ChangeLog).delete()
+    session.commit()
+    session.add(User(name='New User', email='new@example.com'))
+    session.commit()
+    assert [change.seq for change in read_changes(session)] == [6]
@@ -0,0 +1,118 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, Goal, GoalProgress, Workout, NutritionLog, SleepRecord, HealthMetric
+from goals import GoalThreshold, parse_target, refresh_goal_progress
+
+NOW = datetime(2024, 6, 30, 12, 0)
+
+# Setup a fixture for the database session
+@pytest.fixture
+def session():
+    """
+    Create a new database session with two users, their goals and a month of data,
+    and return it to the test function. After the test is run, the session is closed.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+    session.add_all([
+        User(id=1, name='Test User', email='test@example.com', age=30, gender='Male'),
+        User(id=2, name='Other User', email='other@example.com', age=40, gender='Female'),
+        Goal(id=1, user_id=1, goal_type='Weight Loss', target='Lose 5 kg in 3 months'),
+        Goal(id=2, user_id=1, goal_type='Sleep', target='Average sleep quality of at least 3'),
+        Goal(id=3, user_id=2, goal_type='Nutrition', target='Eat under 2000 calories per day'),
+        Goal(id=4, user_id=2, goal_type='Fitness', target='Work out 150 minutes per week'),
+        Goal(id=5, user_id=2, goal_type='Mindfulness', target='Meditate more'),
+    ])
+    for day in range(28):
+        date = NOW - timedelta(days=day)
+        session.add(HealthMetric(user_id=1, date=date, weight=80 - (27 - day) * 0.25, bmi=25, heart_rate=70))
+        session.add(SleepRecord(user_id=1, date=date, duration_hours=7, quality=2 + day % 3))
+        session.add(NutritionLog(user_id=2, date=date, meal_type='Lunch', food_item='Pasta', quantity=1, calories=900))
+        session.add(NutritionLog(user_id=2, date=date, meal_type='Dinner', food_item='Salmon', quantity=1, calories=900))
+        if day % 7 == 0:
+            session.add(Workout(user_id=2, date=date, type='Running', duration_minutes=140, calories_burned=500))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+# Test parsing of goal targets
+def test_parse_target():
+    """
+    Test that free-text targets are parsed into structured thresholds.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    assert parse_target('Weight Loss', 'Lose 5 kg in 3 months') == GoalThreshold('weight_change', 'at_most', -5.0, 90)
+    assert parse_target('Weight Loss', 'Reach 70 kg') == GoalThreshold('weight', 'at_most', 70.0, 30)
+    assert parse_target('Sleep', 'Sleep 8 hours a night') == GoalThreshold('sleep_hours', 'at_least', 8.0, 30)
+    assert parse_target('Sleep Quality', 'At least 3') == GoalThreshold('sleep_quality', 'at_least', 3.0, 30)
+    assert parse_target('Nutrition', 'Eat under 2000 calories per day') == GoalThreshold('daily_calories', 'at_most', 2000.0, 30)
+    assert parse_target('Fitness', 'Burn 500 calories a day') == GoalThreshold('calories_burned_per_week', 'at_least', 3500.0, 30)
+    assert parse_target('Fitness', 'Run 3 times a week over 4 weeks') == GoalThreshold('workouts_per_week', 'at_least', 3.0, 28)
+    assert parse_target('Mindfulness', 'Meditate more') is None
+
+# Test evaluation of goal progress
+def test_refresh_goal_progress(session):
+    """
+    Test that goal progress is evaluated for all goals, and that later refreshes only
+    evaluate goals of users with new data or changed targets.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    assert refresh_goal_progress(session, now=NOW) == 4
+    progress = {row.goal_id: row for row in session.query(GoalProgress).all()}
+    assert progress[1].value == pytest.approx(-6.75)
+    assert progress[1].achieved is True
+    assert progress[2].value == pytest.approx(sum(2 + day % 3 for day in range(28)) / 28)
+    assert progress[2].achieved is False
+    assert progress[3].value == pytest.approx(1800)
+    assert progress[3].achieved is True
+    assert progress[4].value == pytest.approx(4 * 140 * 7 / 30)
+    assert progress[4].achieved is False
+    assert progress[5].metric is None and progress[5].evaluated_at is None
+
+    # Nothing changed, so nothing is evaluated again
+    assert refresh_goal_progress(session, now=NOW + timedelta(minutes=5)) == 0
+
+    # New sleep data for user 1 reevaluates only user 1's goals
+    session.add_all([SleepRecord(user_id=1, date=NOW, duration_hours=8, quality=5) for _ in range(20)])
+    session.commit()
+    assert refresh_goal_progress(session, now=NOW + timedelta(minutes=10)) == 2
+    assert session.get(GoalProgress, 2).achieved is True
+
+    # A changed target is parsed again and evaluated
+    session.query(Goal).filter_by(id=4).update({'target': 'Work out 100 minutes per week'})
+    session.commit()
+    assert refresh_goal_progress(session, now=NOW + timedelta(minutes=15)) == 1
+    session.expire_all()
+    assert session.get(GoalProgress, 4).threshold == 100
+    assert session.get(GoalProgress, 4).achieved is True
+
+    assert refresh_goal_progress(session, now=NOW + timedelta(minutes=20), full=True) == 4
+    assert refresh_goal_progress(session, now=NOW + timedelta(days=2)) == 4
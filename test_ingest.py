@@ -0,0 +1,305 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, Workout, NutritionLog, SleepRecord, HealthMetric
+import ingest
+from approximate import ApproximateAnalytics
+from ingest import IngestBuffer
+
+# Setup a fixture for a database session factory
+@pytest.fixture
+def session_factory(tmp_path):
+    """
+    Create a new file-backed database with one user and return a session factory
+    for it, so that the ingest thread and the test share the same database.
+
+    Parameters
+    ----------
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'ingest.db'}")
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+    session.add(User(name='Test User', email='test@example.com', age=30, gender='Male'))
+    session.commit()
+    session.close()
+    yield DBSession
+    engine.dispose()
+
+# Test batched ingest from many threads
+def test_ingest_batches_events_from_threads(session_factory, tmp_path):
+    """
+    Test that events submitted from many threads are all acknowledged and committed
+    in fewer transactions than events, and that the spill file is reset afterwards.
+
+    Parameters
+    ----------
+    session_factory : sessionmaker
+        The factory used to open sessions on the test database.
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    spill_path = tmp_path / 'spill.log'
+    futures = []
+    lock = threading.Lock()
+
+    def produce(buffer, n):
+        for i in range(n):
+            future = buffer.submit(HealthMetric(user_id=1, date=datetime(2024, 1, 1, 8), weight=70 + i, bmi=22, heart_rate=70))
+            with lock:
+                futures.append(future)
+
+    with IngestBuffer(session_factory, str(spill_path), max_batch_size=100, max_delay=0.05) as buffer:
+        threads = [threading.Thread(target=produce, args=(buffer, 250)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        buffer.submit(SleepRecord(user_id=1, date=datetime(2024, 1, 1), duration_hours=8, quality=4))
+        buffer.flush()
+        assert buffer.batches_committed < 2001
+        # Producers share syncs of the spill file rather than paying one per event
+        assert buffer.syncs < 200
+
+    assert sorted(future.result() for future in futures) == list(range(1, 2001))
+    session = session_factory()
+    assert session.query(HealthMetric).count() == 2000
+    assert session.query(SleepRecord).first().date == datetime(2024, 1, 1)
+    session.close()
+    assert spill_path.read_text() == ''
+
+# Test recovery from the spill file
+def test_ingest_replays_unacknowledged_events(session_factory, tmp_path):
+    """
+    Test that events left unacknowledged in the spill file by a crash are replayed
+    on start, and acknowledged events are not.
+
+    Parameters
+    ----------
+    session_factory : sessionmaker
+        The factory used to open sessions on the test database.
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    spill_path = tmp_path / 'spill.log'
+    values = {'user_id': 1, 'date': '2024-01-02T07:30:00', 'type': 'Running', 'duration_minutes': 30.0}
+    lines = [
+        {'seq': 1, 'table': 'workouts', 'values': values},
+        {'ack': 1},
+        {'seq': 2, 'table': 'workouts', 'values': values},
+        {'seq': 3, 'table': 'nutrition_logs', 'values': {'user_id': 1, 'date': '2024-01-02T08:00:00', 'meal_type': 'Breakfast',
+                                                           'food_item': 'Oatmeal', 'quantity': 1.0, 'calories': 150.0}},
+    ]
+    spill_path.write_text(''.join(json.dumps(line) + '\n' for line in lines) + '{"seq": 4, "tab')
+
+    buffer = IngestBuffer(session_factory, str(spill_path))
+    assert buffer.start() == 2
+    buffer.flush()
+    buffer.close()
+
+    session = session_factory()
+    workout = session.query(Workout).one()
+    assert workout.date == datetime(2024, 1, 2, 7, 30)
+    assert session.query(NutritionLog).one().food_item == 'Oatmeal'
+    session.close()
+
+# Test recovery surviving a crash
+def test_ingest_recovery_keeps_spill_file_until_replaced(session_factory, tmp_path, monkeypatch):
+    """
+    Test that a crash while compacting the spill file on start leaves the original
+    spill file intact, so the next start still replays every unacknowledged event.
+
+    Parameters
+    ----------
+    session_factory : sessionmaker
+        The factory used to open sessions on the test database.
+    tmp_path : Path
+        The temporary directory of the test.
+    monkeypatch : MonkeyPatch
+        Used to crash the replacement of the spill file.
+
+    Returns
+    -------
+    None
+    """
+    spill_path = tmp_path / 'spill.log'
+    values = {'user_id': 1, 'date': '2024-01-02T07:30:00', 'type': 'Running', 'duration_minutes': 30.0}
+    content = ''.join(json.dumps({'seq': seq, 'table': 'workouts', 'values': values}) + '\n' for seq in (1, 2, 3))
+    spill_path.write_text(content)
+
+    def crash(source, destination):
+        raise OSError('crashed')
+
+    monkeypatch.setattr(ingest.os, 'replace', crash)
+    with pytest.raises(OSError):
+        IngestBuffer(session_factory, str(spill_path)).start()
+    assert spill_path.read_text() == content
+    monkeypatch.undo()
+
+    buffer = IngestBuffer(session_factory, str(spill_path))
+    assert buffer.start() == 3
+    buffer.close()
+    session = session_factory()
+    assert session.query(Workout).count() == 3
+    session.close()
+
+# Test durable submits and observers
+def test_ingest_syncs_durable_events_and_notifies_observers(session_factory, tmp_path):
+    """
+    Test that a durable submit returns once its event is in the spill file, and that
+    observers such as approximate analytics see every committed record.
+
+    Parameters
+    ----------
+    session_factory : sessionmaker
+        The factory used to open sessions on the test database.
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    spill_path = tmp_path / 'spill.log'
+    analytics = ApproximateAnalytics()
+    with IngestBuffer(session_factory, str(spill_path), max_delay=0.5, observers=[analytics.observe]) as buffer:
+        future = buffer.submit(Workout(user_id=1, date=datetime(2024, 1, 5), type='Yoga', duration_minutes=30), durable=True)
+        assert not future.done()
+        assert json.loads(spill_path.read_text())['values']['type'] == 'Yoga'
+        for _ in range(9):
+            buffer.submit(Workout(user_id=1, date=datetime(2024, 1, 5), type='Rowing', duration_minutes=30))
+        buffer.flush()
+    assert analytics.workout_types.total == 10
+    assert analytics.most_common_workout_type()[0] == 'Rowing'
+
+# Test acknowledgements to coroutines and failed batches
+def test_ingest_acknowledges_coroutines_and_failures(session_factory, tmp_path):
+    """
+    Test that coroutines receive acknowledgements, and that producers of a batch
+    that fails to commit receive the error.
+
+    Parameters
+    ----------
+    session_factory : sessionmaker
+        The factory used to open sessions on the test database.
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    with IngestBuffer(session_factory, str(tmp_path / 'spill.log'), max_delay=0.01) as buffer:
+        async def produce():
+            return await asyncio.gather(*[
+                buffer.submit_async(Workout(user_id=1, date=datetime(2024, 1, 3), type='Yoga', duration_minutes=60))
+                for _ in range(10)])
+        assert sorted(asyncio.run(produce())) == list(range(1, 11))
+
+        failed = buffer.submit(Workout(user_id=1, date=datetime(2024, 1, 3), duration_minutes=60))
+        with pytest.raises(Exception):
+            failed.result(timeout=5)
+
+        with pytest.raises(ValueError):
+            buffer.submit(User(name='Other User', email='other@example.com'))
+
+    session = session_factory()
+    assert session.query(Workout).count() == 10
+    session.close()
+
+# Test isolating failing events
+def test_ingest_fails_only_invalid_events(session_factory, tmp_path):
+    """
+    Test that an invalid event only fails its own producer, and that the valid events
+    of the same batch are committed.
+
+    Parameters
+    ----------
+    session_factory : sessionmaker
+        The factory used to open sessions on the test database.
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    with IngestBuffer(session_factory, str(tmp_path / 'spill.log'), max_delay=0.2) as buffer:
+        futures = [buffer.submit(Workout(user_id=1, date=datetime(2024, 1, 4), type='Yoga', duration_minutes=30))
+                   for _ in range(5)]
+        failed = buffer.submit(Workout(user_id=1, date=datetime(2024, 1, 4), duration_minutes=30))
+        futures += [buffer.submit(Workout(user_id=1, date=datetime(2024, 1, 4), type='Gym', duration_minutes=30))]
+        assert [future.result(timeout=5) for future in futures] == [1, 2, 3, 4, 5, 7]
+        with pytest.raises(Exception):
+            failed.result(timeout=5)
+
+    session = session_factory()
+    assert session.query(Workout).count() == 6
+    session.close()
+
+# Test retrying while the database is locked
+def test_ingest_retries_and_keeps_events_while_locked(tmp_path):
+    """
+    Test that batches failing because the database is locked are retried until the lock
+    is released, and that events still locked out when the buffer is closed are kept in
+    the spill file and replayed by the next start.
+
+    Parameters
+    ----------
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    path = tmp_path / 'locked.db'
+    engine = create_engine(f"sqlite:///{path}", connect_args={'timeout': 0.01})
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    spill_path = str(tmp_path / 'spill.log')
+
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute('BEGIN EXCLUSIVE')
+    with IngestBuffer(DBSession, spill_path, max_delay=0.01, retry_delay=0.02) as buffer:
+        future = buffer.submit(Workout(user_id=1, date=datetime(2024, 1, 5), type='Yoga', duration_minutes=30))
+        time.sleep(0.2)
+        assert not future.done()
+        blocker.execute('ROLLBACK')
+        assert future.result(timeout=5) == 1
+
+        blocker.execute('BEGIN EXCLUSIVE')
+        locked = buffer.submit(Workout(user_id=1, date=datetime(2024, 1, 6), type='Gym', duration_minutes=30))
+        time.sleep(0.1)
+    with pytest.raises(Exception, match='database is locked'):
+        locked.result(timeout=5)
+    blocker.execute('ROLLBACK')
+    blocker.close()
+
+    buffer = IngestBuffer(DBSession, spill_path)
+    assert buffer.start() == 1
+    buffer.close()
+    session = DBSession()
+    assert sorted(workout.type for workout in session.query(Workout)) == ['Gym', 'Yoga']
+    session.close()
+    engine.dispose()
@@ -1,7 +1,7 @@
 import pytest
 from datetime import datetime
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, clear_mappers
+from sqlalchemy.orm import sessionmaker
 from schema import Base, User, Goal, Workout, NutritionLog, SleepRecord, HealthMetric
 
 # Setup a fixture for the database session
@@ -9,7 +9,7 @@ from schema import Base, User, Goal, Workout, NutritionLog, SleepRecord, HealthM
 def session():
     """
     Create a new database session and return it to the test function. 
-    After the test is run, the session is closed and the mappers are cleared.
+    After the test is run, the session is closed and the engine is disposed.
 
     Parameters
     ----------
@@ -25,7 +25,7 @@ def session():
     session = DBSession()
     yield session
     session.close()
-    clear_mappers()
+    engine.dispose()
 
 # Test User model
 def test_user_model(session):
@@ -0,0 +1,105 @@
+import json
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User
+from profiling import COLUMNS, READERS, INSERTERS, generate_workouts, run_benchmarks, write_report
+
+# Test generating workouts
+def test_generate_workouts_is_reproducible():
+    """
+    Test that the same seed generates the same workouts.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    assert generate_workouts(50, seed=7) == generate_workouts(50, seed=7)
+    assert generate_workouts(50, seed=7) != generate_workouts(50, seed=8)
+
+# Test the benchmark report
+def test_run_benchmarks_writes_comparable_report(tmp_path):
+    """
+    Test that every representation is measured for reads and inserts at every size,
+    and that the report is written as JSON.
+
+    Parameters
+    ----------
+    tmp_path : Path
+        A temporary directory for the report.
+
+    Returns
+    -------
+    None
+    """
+    report = run_benchmarks(sizes=(20, 50), repeat=1)
+    measured = {(result['operation'], result['representation'], result['rows']) for result in report['results']}
+    assert measured == {('read', name, size) for name in READERS for size in (20, 50)} | \
+        {('insert', name, size) for name in INSERTERS for size in (20, 50)}
+    for result in report['results']:
+        assert result['rows_per_second'] > 0
+        assert result['peak_bytes_per_row'] > 0
+
+    reads = {result['representation']: result for result in report['results'] if result['operation'] == 'read' and result['rows'] == 50}
+    assert reads['orm']['bytes_per_row'] > reads['core']['bytes_per_row']
+
+    path = tmp_path / 'report.json'
+    write_report(report, path)
+    assert json.loads(path.read_text()) == report
+
+# Test the scratch database
+def test_run_benchmarks_refuses_existing_databases(tmp_path):
+    """
+    Test that benchmarks run on a new database file, and refuse a database that
+    already exists rather than dropping its tables.
+
+    Parameters
+    ----------
+    tmp_path : Path
+        A temporary directory for the databases.
+
+    Returns
+    -------
+    None
+    """
+    run_benchmarks(f"sqlite:///{tmp_path / 'scratch.db'}", sizes=(10,), repeat=1)
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'existing.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{'name': 'Test User', 'email': 'test@example.com'}])
+    with pytest.raises(ValueError):
+        run_benchmarks(f"sqlite:///{tmp_path / 'existing.db'}", sizes=(10,), repeat=1)
+    with pytest.raises(ValueError):
+        run_benchmarks('postgresql://localhost/health', sizes=(10,), repeat=1)
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(User)) == 1
+    engine.dispose()
+
+# Test the inserted rows
+def test_inserters_store_the_generated_rows():
+    """
+    Test that every inserter stores each generated workout with its values in the right columns.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    rows = generate_workouts(5, seed=2)
+    for name, inserter in INSERTERS.items():
+        engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        inserter(session, rows)
+        stored = session.execute(select(*COLUMNS[1:]).order_by(COLUMNS[0])).all()
+        assert [dict(row._mapping) for row in stored] == rows, name
+        session.close()
+        engine.dispose()
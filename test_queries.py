@@ -0,0 +1,93 @@
+import pytest
+from datetime import date, datetime
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, Workout, NutritionLog
+from queries import apply_daily_corrections
+
+# Setup a fixture for the database session
+@pytest.fixture
+def session():
+    """
+    Create a new database session with two users and their workouts, and return it
+    to the test function. After the test is run, the session is closed.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+    session.add_all([
+        User(id=1, name='Test User', email='test@example.com', age=30, gender='Male'),
+        User(id=2, name='Test User', email='other@example.com', age=40, gender='Female'),
+        Workout(user_id=1, date=datetime(2024, 3, 1, 7, 15), type='Running', duration_minutes=30),
+        Workout(user_id=1, date=datetime(2024, 3, 1, 18, 45), type='Gym', duration_minutes=45),
+        Workout(user_id=1, date=datetime(2024, 3, 2, 0, 0), type='Running', duration_minutes=20),
+        Workout(user_id=2, date=datetime(2024, 3, 1, 9, 0), type='Cycling', duration_minutes=90),
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+# Test daily corrections
+def test_apply_daily_corrections(session):
+    """
+    Test that daily corrections update every workout of the user on that day, leave
+    other days and users untouched, add the nutrition logs, and report the counts.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    result = apply_daily_corrections(session, [
+        (1, date(2024, 3, 1), {
+            'workout': {'type': 'Yoga', 'duration_minutes': 60},
+            'nutrition_logs': [{'meal_type': 'Breakfast', 'food_item': 'Oatmeal', 'quantity': 2, 'calories': 300}]
+        }),
+        (2, datetime(2024, 3, 1, 12, 0), {'workout': {'intensity': 'High'}}),
+        (2, date(2024, 3, 5), {'workout': {'intensity': 'Low'}}),
+    ])
+    assert result == {'workouts_updated': 3, 'nutrition_logs_added': 1}
+
+    workouts = session.query(Workout.user_id, Workout.date, Workout.type, Workout.duration_minutes, Workout.intensity).order_by(Workout.id).all()
+    assert workouts == [
+        (1, datetime(2024, 3, 1, 7, 15), 'Yoga', 60, None),
+        (1, datetime(2024, 3, 1, 18, 45), 'Yoga', 60, None),
+        (1, datetime(2024, 3, 2, 0, 0), 'Running', 20, None),
+        (2, datetime(2024, 3, 1, 9, 0), 'Cycling', 90, 'High'),
+    ]
+    log = session.query(NutritionLog).one()
+    assert (log.user_id, log.date, log.food_item) == (1, datetime(2024, 3, 1), 'Oatmeal')
+
+# Test that corrections use the workout index
+def test_daily_corrections_use_user_date_index(session):
+    """
+    Test that the half-open day range on a user's workouts is served by the
+    (user_id, date) index rather than a table scan.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    plan = session.execute(text(
+        "EXPLAIN QUERY PLAN UPDATE workouts SET type = 'Yoga' WHERE user_id = 1 AND date >= '2024-03-01' AND date < '2024-03-02'"
+    )).all()
+    assert 'idx_workout_user_date' in ' '.join(row[-1] for row in plan)
@@ -0,0 +1,178 @@
+import gzip
+import json
+import pytest
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from schema import Base, migrate, User, SleepRecord, HealthMetric, DailySleepRecord, DailyHealthMetric
+from retention import POLICIES, apply_retention, enable_incremental_vacuum, run_retention
+
+NOW = datetime(2024, 6, 30, 12, 0)
+
+# Setup a fixture for a file-backed database session
+@pytest.fixture
+def session(tmp_path):
+    """
+    Create a new file-backed database session with 120 days of health metrics and sleep
+    records for one user, and return it to the test function. After the test is run,
+    the session is closed.
+
+    Parameters
+    ----------
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'retention.db'}")
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+    session.add(User(id=1, name='Test User', email='test@example.com', age=30, gender='Male'))
+    for day in range(120):
+        start = datetime.combine(NOW.date() - timedelta(days=day), datetime.min.time())
+        session.add(HealthMetric(user_id=1, date=start + timedelta(hours=8), weight=80, bmi=24, heart_rate=60, blood_pressure='120/80'))
+        session.add(HealthMetric(user_id=1, date=start + timedelta(hours=20), weight=82, bmi=25, heart_rate=80, blood_pressure='120/80'))
+        session.add(SleepRecord(user_id=1, date=start, duration_hours=7, quality='3'))
+        session.add(SleepRecord(user_id=1, date=start + timedelta(hours=14), duration_hours=1, quality='5'))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+# Test downsampling and archival
+def test_retention_downsamples_and_archives_old_rows(session, tmp_path):
+    """
+    Test that rows older than the retention period are summarized per day, archived
+    and deleted in chunks, and that late-arriving old rows merge into the summaries.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    archive_dir = tmp_path / 'archive'
+    results = run_retention(session, now=NOW, archive_dir=str(archive_dir), chunk_size=7)
+    assert results['health_metrics'] == 2 * 29
+    assert results['sleep_records'] == 2 * 29
+
+    cutoff = datetime(2024, 4, 1)
+    assert session.query(HealthMetric).filter(HealthMetric.date < cutoff).count() == 0
+    assert session.query(HealthMetric).count() == 2 * 91
+    assert session.query(DailyHealthMetric).count() == 29
+    summary = session.get(DailyHealthMetric, (1, date(2024, 3, 31)))
+    assert (summary.weight, summary.bmi, summary.heart_rate, summary.samples) == (81, 24.5, 70, 2)
+    sleep = session.get(DailySleepRecord, (1, date(2024, 3, 31)))
+    assert (sleep.duration_hours, sleep.quality, sleep.samples) == (8, 4, 2)
+
+    archived = []
+    for path in archive_dir.iterdir():
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            archived.extend(json.loads(line) for line in archive)
+    assert len(archived) == 4 * 29
+    assert {'date': '2024-03-31T20:00:00', 'weight': 82.0, 'blood_pressure': '120/80'}.items() <= \
+        next(row for row in archived if row.get('date') == '2024-03-31T20:00:00' and 'weight' in row).items()
+
+    session.add(HealthMetric(user_id=1, date=datetime(2024, 3, 31, 22), weight=86, bmi=27, heart_rate=None))
+    session.commit()
+    assert apply_retention(session, POLICIES[0], now=NOW, archive_dir=str(archive_dir)) == 1
+    session.expire_all()
+    summary = session.get(DailyHealthMetric, (1, date(2024, 3, 31)))
+    assert (summary.weight, summary.bmi, summary.heart_rate, summary.samples) == (pytest.approx(82.6667, abs=1e-3), pytest.approx(25.3333, abs=1e-3), 70, 3)
+    assert (summary.weight_samples, summary.heart_rate_samples) == (3, 2)
+
+# Test merging means with missing values
+def test_retention_weights_means_by_values_present(session, tmp_path):
+    """
+    Test that summary means merged across chunks are weighted by the number of rows
+    with a value, not by every row of the day.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    day = datetime(2024, 1, 15)
+    session.query(HealthMetric).delete()
+    session.add_all([
+        HealthMetric(user_id=1, date=day + timedelta(hours=7), weight=80, bmi=24, heart_rate=60),
+        HealthMetric(user_id=1, date=day + timedelta(hours=8), weight=None, bmi=None, heart_rate=70),
+        HealthMetric(user_id=1, date=day + timedelta(hours=9), weight=100, bmi=None, heart_rate=None),
+    ])
+    session.commit()
+    assert apply_retention(session, POLICIES[0], now=NOW, archive_dir=str(tmp_path / 'archive'), chunk_size=2) == 3
+
+    summary = session.get(DailyHealthMetric, (1, day.date()))
+    assert (summary.weight, summary.bmi, summary.heart_rate, summary.samples) == (90, 24, 65, 3)
+    assert (summary.weight_samples, summary.bmi_samples, summary.heart_rate_samples) == (2, 1, 2)
+
+# Test space reclamation
+def test_retention_reclaims_space_with_incremental_vacuum(session, tmp_path):
+    """
+    Test that after switching to incremental auto-vacuum, the pages freed by retention
+    are returned to the file system.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    engine = session.get_bind()
+    session.close()
+    assert enable_incremental_vacuum(engine) is True
+    assert enable_incremental_vacuum(engine) is False
+
+    size = (tmp_path / 'retention.db').stat().st_size
+    results = run_retention(session, policies=[POLICIES[0]._replace(keep_days=1)], now=NOW, archive_dir=str(tmp_path / 'archive'))
+    assert results['pages_freed'] > 0
+    assert (tmp_path / 'retention.db').stat().st_size < size
+
+# Test migrating existing databases
+def test_migrate_adds_nullable_columns_only(tmp_path):
+    """
+    Test that migrating a database created before columns were added to its tables adds
+    the nullable ones, and refuses to add a column that is not nullable.
+
+    Parameters
+    ----------
+    tmp_path : Path
+        The temporary directory of the database file.
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE daily_health_metrics DROP COLUMN weight_samples'))
+        connection.execute(text('DROP INDEX idx_workout_user_date'))
+    migrate(engine)
+    assert 'weight_samples' in {column['name'] for column in inspect(engine).get_columns('daily_health_metrics')}
+    assert 'idx_workout_user_date' in {index['name'] for index in inspect(engine).get_indexes('workouts')}
+
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE food_items DROP COLUMN entries'))
+    with pytest.raises(RuntimeError, match='entries'):
+        migrate(engine)
+    engine.dispose()
@@ -0,0 +1,170 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, NutritionLog, FoodItem
+from search import benchmark_search, install_search, search_foods, search_users
+
+# Setup a fixture for the database session
+@pytest.fixture
+def session():
+    """
+    Create a new database session with users and nutrition logs, install the search
+    indexes and return the session to the test function. After the test is run, the
+    session is closed.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+    session.add_all([
+        User(id=1, name='John Doe', email='johndoe@example.com', age=30, gender='Male'),
+        User(id=2, name='Jane Johnson', email='jane@example.org', age=41, gender='Female'),
+        User(id=3, name='Maria Garcia', email='mgarcia@example.net', age=25, gender='Female'),
+    ])
+    for food_item in ['Chicken Breast', 'Chicken Breast', 'Chickpea Curry', 'Broccoli', 'Greek Yogurt']:
+        session.add(NutritionLog(user_id=1, date=datetime(2024, 1, 5, 12), meal_type='Lunch', food_item=food_item,
+                                 quantity=1, calories=300))
+    session.commit()
+    install_search(engine)
+    yield session
+    session.close()
+    engine.dispose()
+
+# Test the food dictionary
+def test_food_dictionary_is_kept_in_sync(session):
+    """
+    Test that the food dictionary holds each distinct food item with its number of
+    logs, and that new nutrition logs are added to it and its search index.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    assert dict(session.execute(select(FoodItem.name, FoodItem.entries)).all()) == {
+        'Chicken Breast': 2, 'Chickpea Curry': 1, 'Broccoli': 1, 'Greek Yogurt': 1
+    }
+    assert search_foods(session, 'pump') == []
+
+    session.add_all([
+        NutritionLog(user_id=2, date=datetime(2024, 1, 6, 8), meal_type='Breakfast', food_item='Pumpkin Soup', quantity=1, calories=200),
+        NutritionLog(user_id=2, date=datetime(2024, 1, 6, 12), meal_type='Lunch', food_item='Broccoli', quantity=1, calories=50),
+    ])
+    session.commit()
+    assert [name for _, name, _ in search_foods(session, 'pump')] == ['Pumpkin Soup']
+    assert session.scalar(select(FoodItem.entries).where(FoodItem.name == 'Broccoli')) == 2
+
+# Test prefix and typo-tolerant search
+def test_search_foods_by_prefix_and_with_typos(session):
+    """
+    Test that foods are found by word prefixes, and by misspelled names when fuzzy
+    matching is enabled.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    assert {name for _, name, _ in search_foods(session, 'chick')} == {'Chicken Breast', 'Chickpea Curry'}
+    assert [name for _, name, _ in search_foods(session, 'chi bre')] == ['Chicken Breast']
+    assert [name for _, name, _ in search_foods(session, 'yog')] == ['Greek Yogurt']
+    assert [name for _, name, _ in search_foods(session, 'brocoli')] == ['Broccoli']
+    assert search_foods(session, 'brocoli', fuzzy=False) == []
+    assert search_foods(session, '"*') == []
+
+# Test searching users
+def test_search_users_follows_changes(session):
+    """
+    Test that users are found by name and email address, including after they are
+    updated or deleted.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    assert {user_id for user_id, _, _ in search_users(session, 'john')} == {1, 2}
+    assert [user_id for user_id, _, _ in search_users(session, 'mgarcia')] == [3]
+    assert [user_id for user_id, _, _ in search_users(session, 'jonh doe')] == [1]
+
+    user = session.get(User, 3)
+    user.name = 'Maria Lopez'
+    session.delete(session.get(User, 2))
+    session.commit()
+    assert [user_id for user_id, _, _ in search_users(session, 'lopez')] == [3]
+    assert [user_id for user_id, _, _ in search_users(session, 'john', fuzzy=False)] == [1]
+
+# Test search at a realistic size
+def test_search_users_at_scale():
+    """
+    Test that exact, prefix and misspelled queries over 100,000 users find the right
+    users, and that an exact match is not padded with typo-tolerant matches. Latency is
+    measured by benchmark_search() rather than asserted here.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    first_names = ['John', 'Jane', 'Maria', 'David', 'Laura', 'Pat', 'Alex', 'Sam']
+    last_names = ['Smith', 'Jones', 'Garcia', 'Brown', 'Lee', 'Lopez', 'Miller', 'Davis']
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {'name': f'{first_names[i % 8]} {last_names[i // 8 % 8]}{i % 97}', 'email': f'user{i}@example.com',
+             'age': 18 + i % 48, 'gender': 'Other'}
+            for i in range(100000)
+        ])
+    install_search(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        assert [email for _, _, email in search_users(session, 'user12345@example.com')] == ['user12345@example.com']
+        results = search_users(session, 'maria gar')
+        assert results and all(name.startswith('Maria Garcia') for _, name, _ in results)
+        results = search_users(session, 'davd brwn')
+        assert results and all(name.startswith('David Brown') for _, name, _ in results)
+    finally:
+        session.close()
+        engine.dispose()
+
+# Test the search benchmark
+def test_benchmark_search_times_every_query():
+    """
+    Test that the benchmark reports a latency for every query.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    latencies = benchmark_search(users=1000, queries=['john', 'jonh'], repeat=1)
+    assert set(latencies) == {'john', 'jonh'}
+    assert all(latency > 0 for latency in latencies.values())
@@ -0,0 +1,116 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, Goal, Workout, NutritionLog, SleepRecord
+from statements import workout_frequency
+import queries
+import sharding
+from sharding import ShardedDatabase
+
+def _records():
+    records = []
+    for index in range(12):
+        user_id = index + 1
+        records.append(User(name=f'User {user_id}', email=f'user{user_id}@example.com', age=20 + index * 4, gender='Female'))
+        records.append(Goal(user_id=user_id, goal_type='Sleep', target='Sleep 8 hours per night'))
+        records.append(Workout(user_id=user_id, date=datetime(2024, 1, 5, 7), type=['Running', 'Yoga', 'Cycling'][index % 3],
+                               duration_minutes=30, calories_burned=100 + index * 10, intensity='Medium'))
+        records.append(Workout(user_id=user_id, date=datetime(2024, 1, 6, 7), type='Running',
+                               duration_minutes=45, calories_burned=200, intensity='High'))
+        records.append(SleepRecord(user_id=user_id, date=datetime(2024, 1, 5), duration_hours=6 + index % 4, quality=str(1 + index % 5)))
+        records.append(NutritionLog(user_id=user_id, date=datetime(2024, 1, 5, 8), meal_type='Breakfast',
+                                    food_item=['Oatmeal', 'Pasta', 'Salad', 'Steak'][index % 4], quantity=1, calories=100 + index * 50))
+    return records
+
+# Setup a fixture for the sharded database
+@pytest.fixture
+def database(tmp_path):
+    """
+    Create a sharded database of four shard files holding twelve users and their records,
+    and return it to the test function. After the test is run, the database is closed.
+
+    Parameters
+    ----------
+    tmp_path : Path
+        A temporary directory for the shard files.
+
+    Returns
+    -------
+    None
+    """
+    database = ShardedDatabase([f'sqlite:///{tmp_path}/shard-{index}.db' for index in range(4)])
+    database.write(_records())
+    yield database
+    database.close()
+
+# Test routing of a user's rows
+def test_user_rows_are_stored_in_one_shard(database):
+    """
+    Test that users are spread over the shards with unique ids, and that each user's
+    rows are stored in the user's shard only.
+
+    Parameters
+    ----------
+    database : ShardedDatabase
+        The sharded database.
+
+    Returns
+    -------
+    None
+    """
+    user_ids = sorted(user_id for ids in database.scatter(lambda session: session.scalars(select(User.id)).all()) for user_id in ids)
+    assert user_ids == list(range(1, 13))
+    assert sum(1 for count in database.scatter(lambda session: session.scalar(select(func.count(User.id)))) if count) > 1
+
+    for shard, rows in enumerate(database.scatter(
+        lambda session: session.execute(select(Workout.user_id).union_all(select(Goal.user_id), select(SleepRecord.user_id))).scalars().all()
+    )):
+        assert all(database.shard_for(user_id) == shard for user_id in rows)
+
+    session = database.session_for(5)
+    assert sorted(workout_frequency(session, 5)) == [('Running', 1), ('Yoga', 1)]
+    session.close()
+
+    with pytest.raises(ValueError):
+        database.write([Workout(date=datetime(2024, 1, 5), type='Running', duration_minutes=10, calories_burned=50)])
+
+# Test scatter-gather reports
+def test_population_reports_match_single_database(database):
+    """
+    Test that the scatter-gather reports merged from all shards match the reports of
+    queries.py on a single database holding the same rows.
+
+    Parameters
+    ----------
+    database : ShardedDatabase
+        The sharded database.
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    records = _records()
+    for user_id, record in enumerate((record for record in records if isinstance(record, User)), 1):
+        record.id = user_id
+    session.add_all(records)
+    session.commit()
+
+    expected_sleep = queries.average_sleep_by_age_group(session)
+    assert [age_group for age_group, _, _ in sharding.average_sleep_by_age_group(database)] == [row[0] for row in expected_sleep]
+    for (_, duration, quality), (_, expected_duration, expected_quality) in zip(sharding.average_sleep_by_age_group(database), expected_sleep):
+        assert duration == pytest.approx(expected_duration)
+        assert quality == pytest.approx(expected_quality)
+
+    assert sharding.most_common_workout_type(database) == tuple(queries.most_common_workout_type(session))
+    assert [(food, pytest.approx(calories)) for food, calories in sharding.top_high_calorie_foods(database)] == \
+        [tuple(row) for row in queries.top_high_calorie_foods(session)]
+    assert sharding.total_calories_burned_per_user(database) == sorted(
+        session.execute(select(Workout.user_id, func.sum(Workout.calories_burned)).group_by(Workout.user_id)).all())
+    assert database.gather_analytics('workouts') == [(24,)]
+
+    session.close()
+    engine.dispose()
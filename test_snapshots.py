@@ -0,0 +1,79 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, Workout
+from queries import most_common_workout_type
+from snapshots import SnapshotManager
+
+# Setup a fixture for a file-backed database session
+@pytest.fixture
+def session(tmp_path):
+    """
+    Create a new file-backed database session with one user and workout, and return it
+    to the test function. After the test is run, the session is closed.
+
+    Parameters
+    ----------
+    tmp_path : Path
+        The temporary directory of the test.
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+    session.add(User(id=1, name='Test User', email='test@example.com', age=30, gender='Male'))
+    session.add(Workout(user_id=1, date=datetime(2024, 1, 1), type='Running', duration_minutes=30))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+# Test reports served from snapshots
+@pytest.mark.parametrize('method', ['backup', 'vacuum'])
+def test_reports_read_newest_snapshot(session, tmp_path, method):
+    """
+    Test that reports read the newest snapshot with its staleness, do not see writes
+    made after it was taken, and cannot write to it.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the live database.
+    tmp_path : Path
+        The temporary directory of the test.
+    method : str
+        The method used to copy the database.
+
+    Returns
+    -------
+    None
+    """
+    manager = SnapshotManager(session.get_bind(), str(tmp_path / 'snapshots'), keep=2, method=method)
+    first = manager.refresh()
+
+    session.add_all([Workout(user_id=1, date=datetime(2024, 1, 2), type='Yoga', duration_minutes=60) for _ in range(2)])
+    session.commit()
+
+    result = manager.run_report(most_common_workout_type)
+    assert tuple(result.rows) == ('Running', 1)
+    assert result.snapshot_path == first.path
+    assert result.snapshot_created_at == first.created_at
+    assert timedelta(0) <= result.staleness < timedelta(minutes=1)
+
+    manager.refresh()
+    manager.refresh()
+    assert len(manager.snapshots()) == 2
+    assert tuple(manager.run_report(most_common_workout_type).rows) == ('Yoga', 2)
+
+    snapshot_session, _ = manager.session()
+    snapshot_session.add(User(name='Other User', email='other@example.com'))
+    with pytest.raises(OperationalError):
+        snapshot_session.commit()
+    snapshot_session.close()
+    manager.stop()
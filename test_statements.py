@@ -0,0 +1,104 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, Workout, SleepRecord, HealthMetric
+from statements import get_user, find_user_by_email, user_progress, workout_frequency, latest_sleep, benchmark
+
+# Setup a fixture for the database session
+@pytest.fixture(scope="module")
+def session():
+    """
+    Create a new database session with a user and their records, and return it to
+    the test function. After the test is run, the session is closed.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+    session.add(User(id=1, name='Test User', email='test@example.com', age=30, gender='Male'))
+    for day in range(1, 6):
+        session.add(HealthMetric(user_id=1, date=datetime(2024, 1, day, 8), weight=80 - day, bmi=25, heart_rate=70))
+        session.add(SleepRecord(user_id=1, date=datetime(2024, 1, day), duration_hours=7 + day / 10, quality=str(day)))
+        session.add(Workout(user_id=1, date=datetime(2024, 1, day), type='Running' if day % 2 else 'Yoga', duration_minutes=30))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+# Test prepared lookups against the ORM queries
+def test_prepared_lookups_match_orm_queries(session):
+    """
+    Test that the prepared lookups return the same rows as the equivalent ORM queries,
+    including converted dates.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    assert get_user(session, 1) == (1, 'Test User', 'test@example.com', 30, 'Male')
+    assert get_user(session, 2) is None
+    assert find_user_by_email(session, 'test@example.com')[0] == 1
+
+    assert user_progress(session, 1) == [tuple(row) for row in session.query(
+        HealthMetric.date, HealthMetric.weight, HealthMetric.bmi).filter(HealthMetric.user_id == 1).order_by(HealthMetric.date)]
+    assert user_progress(session, 1)[0][0] == datetime(2024, 1, 1, 8)
+
+    assert sorted(workout_frequency(session, 1)) == sorted(tuple(row) for row in session.query(
+        Workout.type, func.count(Workout.type)).filter(Workout.user_id == 1).group_by(Workout.type))
+
+    assert latest_sleep(session, 1) == (datetime(2024, 1, 5), 7.5, '5')
+    assert latest_sleep(session, 2) is None
+
+# Test that prepared lookups see the session's pending changes
+def test_prepared_lookups_share_session_transaction(session):
+    """
+    Test that the prepared lookups run in the session's transaction, so they see
+    changes flushed but not yet committed.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    session.add(SleepRecord(user_id=1, date=datetime(2024, 1, 6), duration_hours=9, quality='4'))
+    session.flush()
+    assert latest_sleep(session, 1) == (datetime(2024, 1, 6), 9, '4')
+    session.rollback()
+    assert latest_sleep(session, 1)[0] == datetime(2024, 1, 5)
+
+# Test the benchmark
+def test_benchmark_reports_per_call_times(session):
+    """
+    Test that the benchmark reports ORM and prepared per-call times for each lookup.
+
+    Parameters
+    ----------
+    session : SQLAlchemy session
+        The session object used to interact with the database.
+
+    Returns
+    -------
+    None
+    """
+    results = benchmark(session, number=20)
+    assert set(results) == {'user_progress', 'workout_frequency', 'latest_sleep', 'get_user'}
+    for timings in results.values():
+        assert timings['orm'] > 0 and timings['prepared'] > 0
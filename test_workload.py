@@ -0,0 +1,147 @@
+import sqlite3
+import time
+import pytest
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import sessionmaker
+from schema import Base, User, Workout, NutritionLog, SleepRecord, HealthMetric
+import workload
+from workload import Operation, generate_workload, replay
+
+# Setup a fixture for the session factory
+@pytest.fixture
+def session_factory(tmp_path):
+    """
+    Create a new database file with three users, and return a session factory to the
+    test function. After the test is run, the engine is disposed.
+
+    Parameters
+    ----------
+    tmp_path : Path
+        A temporary directory for the database file.
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine(f'sqlite:///{tmp_path}/workload.db')
+    Base.metadata.create_all(engine)
+    DBSession = sessionmaker(bind=engine)
+    session = DBSession()
+    session.add_all([User(id=user_id, name=f'User {user_id}', email=f'user{user_id}@example.com', age=20 + user_id * 10,
+                          gender='Female') for user_id in (1, 2, 3)])
+    session.commit()
+    session.close()
+    yield DBSession
+    engine.dispose()
+
+# Test generating workloads
+def test_generate_workload_is_reproducible():
+    """
+    Test that the same seed generates the same operations, with the configured mix and
+    increasing arrival times.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    operations = generate_workload([1, 2, 3], n=200, rate=100, seed=3)
+    assert operations == generate_workload([3, 2, 1], n=200, rate=100, seed=3)
+    assert operations != generate_workload([1, 2, 3], n=200, rate=100, seed=4)
+    assert all(earlier.at < later.at for earlier, later in zip(operations, operations[1:]))
+
+    operations = generate_workload([1, 2, 3], n=200, ratios={'ingest': 3, 'get_user': 1}, seed=3)
+    assert {operation.kind for operation in operations} == {'ingest', 'get_user'}
+    assert all(operation.at == 0 for operation in operations)
+    with pytest.raises(ValueError):
+        generate_workload([1], ratios={'drop_tables': 1})
+
+# Test replaying workloads
+def test_replay_reports_throughput_and_latencies(session_factory):
+    """
+    Test that every operation is replayed by the concurrent workers, and that the
+    report counts them per kind with latency histograms.
+
+    Parameters
+    ----------
+    session_factory : sessionmaker
+        The factory of sessions to the database.
+
+    Returns
+    -------
+    None
+    """
+    operations = generate_workload([1, 2, 3], n=120, seed=5)
+    report = replay(operations, session_factory, workers=3)
+    assert report['operations'] == 120
+    assert report['errors'] == 0
+    assert report['throughput'] > 0
+    for kind, summary in report['by_kind'].items():
+        assert summary['count'] == sum(operation.kind == kind for operation in operations)
+        assert sum(summary['histogram'].values()) == summary['count']
+        assert summary['p50_ms'] <= summary['p99_ms'] <= summary['max_ms']
+
+    session = session_factory()
+    rows = sum(session.scalar(select(func.count()).select_from(model)) for model in (Workout, NutritionLog, SleepRecord, HealthMetric))
+    assert rows == sum(operation.kind in ('ingest', 'daily_correction') for operation in operations)
+    session.close()
+
+# Test counting lock errors
+def test_replay_counts_database_is_locked(session_factory, tmp_path):
+    """
+    Test that operations failing because another connection holds the write lock are
+    counted as 'database is locked' errors.
+
+    Parameters
+    ----------
+    session_factory : sessionmaker
+        The factory of sessions to the database, used to create it.
+    tmp_path : Path
+        The temporary directory of the database file.
+
+    Returns
+    -------
+    None
+    """
+    engine = create_engine(f'sqlite:///{tmp_path}/workload.db', connect_args={'timeout': 0.05})
+    blocker = sqlite3.connect(tmp_path / 'workload.db', isolation_level=None)
+    blocker.execute('BEGIN EXCLUSIVE')
+    try:
+        report = replay(generate_workload([1, 2, 3], n=6, ratios={'ingest': 1}, seed=6), sessionmaker(bind=engine), workers=2)
+    finally:
+        blocker.execute('ROLLBACK')
+        blocker.close()
+        engine.dispose()
+    assert report['locked'] == report['errors'] == 6
+    assert report['by_kind']['ingest']['locked'] == 6
+    assert report['locked_seconds'] > 0
+
+# Test measuring latency from arrival times
+def test_replay_measures_latency_from_arrival(session_factory, monkeypatch):
+    """
+    Test that operations queued behind a slow one are counted with the time they waited
+    for a worker, and that they are taken by an idle worker rather than waiting.
+
+    Parameters
+    ----------
+    session_factory : sessionmaker
+        The factory of sessions to the database.
+    monkeypatch : MonkeyPatch
+        Used to add a slow operation.
+
+    Returns
+    -------
+    None
+    """
+    monkeypatch.setitem(workload.OPERATIONS, 'slow', lambda session, params: time.sleep(0.3))
+    operations = [Operation(0.0, 'slow', {})] + [Operation(0.01 * i, 'get_user', {'user_id': 1}) for i in range(1, 6)]
+
+    report = replay(operations, session_factory, workers=1)
+    assert report['by_kind']['get_user']['p50_ms'] >= 200
+
+    report = replay(operations, session_factory, workers=2)
+    assert report['by_kind']['slow']['max_ms'] >= 300
+    assert report['by_kind']['get_user']['max_ms'] < 100
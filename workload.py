@@ -0,0 +1,308 @@
+import bisect
+import random
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from queue import Empty, SimpleQueue
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from schema import engine, User
+from ingest import MODELS
+import queries
+import statements
+
+# Connect to session
+Session = sessionmaker(bind=engine)
+session = Session()
+
+Operation = namedtuple('Operation', ['at', 'kind', 'params'])
+Operation.__doc__ = """
+A generated operation, to be started 'at' seconds after the replay starts, running
+OPERATIONS[kind] with params.
+"""
+
+FOOD_ITEMS = ['Pasta', 'Rice', 'Chicken Breast', 'Salmon', 'Broccoli', 'Spinach Salad', 'Beef Steak',
+              'Scrambled Eggs', 'Greek Yogurt', 'Protein Shake']
+
+# Dates of generated records start here, rather than now, so workloads do not depend on the day they are generated
+START_DATE = datetime(2024, 1, 1)
+
+def _ingest(session, params):
+    session.add(MODELS[params['table']](**params['values']))
+    session.commit()
+
+def _daily_correction(session, params):
+    queries.apply_daily_corrections(session, [(params['user_id'], params['day'], params['changes'])])
+
+# Operations by kind, each taking a session and the generated params
+OPERATIONS = {
+    'ingest': _ingest,
+    'daily_correction': _daily_correction,
+    'get_user': lambda session, params: statements.get_user(session, params['user_id']),
+    'user_progress': lambda session, params: statements.user_progress(session, params['user_id']),
+    'workout_frequency': lambda session, params: statements.workout_frequency(session, params['user_id']),
+    'latest_sleep': lambda session, params: statements.latest_sleep(session, params['user_id']),
+    'average_sleep_by_age_group': lambda session, params: queries.average_sleep_by_age_group(session),
+    'most_common_workout_type': lambda session, params: queries.most_common_workout_type(session),
+    'top_high_calorie_foods': lambda session, params: queries.top_high_calorie_foods(session),
+}
+
+# Relative frequencies of the operations, mostly ingest with some lookups and few reports
+DEFAULT_RATIOS = {
+    'ingest': 70,
+    'daily_correction': 2,
+    'get_user': 8,
+    'user_progress': 5,
+    'workout_frequency': 5,
+    'latest_sleep': 5,
+    'average_sleep_by_age_group': 2,
+    'most_common_workout_type': 2,
+    'top_high_calorie_foods': 1,
+}
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf')]
+
+def _event(generator, user_id):
+    """
+    Generate an ingest event for a user.
+
+    Parameters
+    ----------
+    generator : Random
+        The seeded random generator.
+    user_id : int
+        The id of the user.
+
+    Returns
+    -------
+    dict
+        The 'table' and column 'values' of the event.
+    """
+    date = START_DATE + timedelta(seconds=generator.randint(0, 365 * 24 * 3600))
+    table = generator.choice(sorted(MODELS))
+    if table == 'workouts':
+        values = {'type': generator.choice(['Running', 'Cycling', 'Swimming', 'Gym', 'Yoga']),
+                  'duration_minutes': generator.randint(15, 120), 'intensity': generator.choice(['Low', 'Medium', 'High']),
+                  'calories_burned': generator.randint(100, 1000)}
+    elif table == 'nutrition_logs':
+        values = {'meal_type': generator.choice(['Breakfast', 'Lunch', 'Dinner', 'Snack']),
+                  'food_item': generator.choice(FOOD_ITEMS), 'quantity': generator.randint(1, 5),
+                  'calories': generator.randint(50, 700)}
+    elif table == 'sleep_records':
+        values = {'duration_hours': round(generator.uniform(4.0, 12.0), 2), 'quality': str(generator.randint(1, 5))}
+    else:
+        values = {'weight': round(generator.uniform(50.0, 100.0), 2), 'bmi': round(generator.uniform(18.5, 30.0), 2),
+                  'heart_rate': generator.randint(60, 100),
+                  'blood_pressure': f"{generator.randint(90, 120)}/{generator.randint(60, 80)}"}
+    return {'table': table, 'values': {'user_id': user_id, 'date': date, **values}}
+
+def generate_workload(user_ids, n=1000, ratios=None, rate=None, seed=0):
+    """
+    Generate a reproducible mix of operations. The same arguments always generate the
+    same operations, with the same parameters and arrival times.
+
+    Parameters
+    ----------
+    user_ids : list
+        The ids of the users the operations act on.
+    n : int, optional
+        The number of operations. Default is 1000.
+    ratios : dict, optional
+        The relative frequency of each kind of operation. Default is DEFAULT_RATIOS.
+    rate : float, optional
+        The mean number of operations started per second, arriving as a Poisson process.
+        Default is None, starting every operation as soon as a worker is free.
+    seed : int, optional
+        The seed of the random generator. Default is 0.
+
+    Returns
+    -------
+    list
+        The operations, ordered by arrival time.
+    """
+    ratios = ratios or DEFAULT_RATIOS
+    unknown = set(ratios) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations {sorted(unknown)}.")
+    if not user_ids:
+        raise ValueError("Cannot generate a workload without users.")
+    user_ids = sorted(user_ids)
+    kinds = sorted(ratios)
+    weights = [ratios[kind] for kind in kinds]
+
+    generator = random.Random(seed)
+    operations = []
+    at = 0.0
+    for _ in range(n):
+        if rate:
+            at += generator.expovariate(rate)
+        kind = generator.choices(kinds, weights)[0]
+        user_id = generator.choice(user_ids)
+        if kind == 'ingest':
+            params = _event(generator, user_id)
+        elif kind == 'daily_correction':
+            day = (START_DATE + timedelta(days=generator.randint(0, 364))).date()
+            params = {'user_id': user_id, 'day': day, 'changes': {
+                'workout': {'duration_minutes': generator.randint(15, 120)},
+                'nutrition_logs': [{'meal_type': 'Snack', 'food_item': generator.choice(FOOD_ITEMS),
+                                    'quantity': 1, 'calories': generator.randint(50, 700)}],
+            }}
+        else:
+            params = {'user_id': user_id}
+        operations.append(Operation(at, kind, params))
+    return operations
+
+def _is_locked(error):
+    # Prepared lookups raise the driver's OperationalError, other operations SQLAlchemy's wrapper of it
+    return isinstance(error, (OperationalError, sqlite3.OperationalError)) and 'database is locked' in str(error)
+
+def _summarize(kind, latencies, errors, locked):
+    """
+    Summarize the latencies and errors of one kind of operation.
+
+    Parameters
+    ----------
+    kind : str
+        The kind of operation.
+    latencies : list
+        The latencies of the operations in seconds, including failed ones.
+    errors : int
+        The number of operations that failed.
+    locked : int
+        The number of operations that failed with 'database is locked'.
+
+    Returns
+    -------
+    dict
+        The count, errors, latency percentiles and histogram in milliseconds.
+    """
+    latencies = sorted(latency * 1000 for latency in latencies)
+    histogram = [0] * len(LATENCY_BUCKETS)
+    for latency in latencies:
+        histogram[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] if latencies else None
+
+    return {
+        'kind': kind,
+        'count': len(latencies),
+        'errors': errors,
+        'locked': locked,
+        'mean_ms': sum(latencies) / len(latencies) if latencies else None,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'max_ms': latencies[-1] if latencies else None,
+        'histogram': {str(bucket): count for bucket, count in zip(LATENCY_BUCKETS, histogram)},
+    }
+
+def replay(operations, session_factory=Session, workers=4):
+    """
+    Replay operations against the database from concurrent workers, each with its own
+    session, which is closed after every operation as a request would close it.
+    Workers take the next operation from a shared queue in arrival order as soon as they
+    are free, and start it no earlier than its arrival time, so that an operation never
+    waits behind a slow one while another worker is idle. Operations that fail are
+    rolled back and counted, separating those that failed with 'database is locked'.
+
+    Latencies are measured from the arrival time of each operation rather than from when
+    a worker starts it, so that time spent waiting for a free worker is counted as it
+    would be by a client, instead of being hidden by the replay falling behind. Workloads
+    without arrival times, generated without a rate, have no schedule to fall behind, and
+    their latencies are measured from when a worker starts each operation.
+
+    Parameters
+    ----------
+    operations : list
+        The operations, as generated by generate_workload().
+    session_factory : sessionmaker, optional
+        The factory of the workers' sessions. Default is the module's Session.
+    workers : int, optional
+        The number of concurrent workers. Default is 4.
+
+    Returns
+    -------
+    dict
+        The number of operations, elapsed seconds, throughput in operations per second,
+        errors, 'database is locked' errors, the total seconds spent in operations that
+        failed with it, the first message of each type of error, and a latency summary
+        per kind of operation.
+    """
+    pending = SimpleQueue()
+    for operation in sorted(operations, key=lambda operation: operation.at):
+        pending.put(operation)
+    scheduled = any(operation.at for operation in operations)
+    results = [[] for _ in range(workers)]
+    error_messages = {}
+    started = time.perf_counter()
+
+    def run(worker):
+        session = session_factory()
+        try:
+            while True:
+                try:
+                    operation = pending.get_nowait()
+                except Empty:
+                    break
+                arrival = started + operation.at
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if not scheduled:
+                    arrival = time.perf_counter()
+                error = None
+                try:
+                    OPERATIONS[operation.kind](session, operation.params)
+                except Exception as exception:
+                    error = 'locked' if _is_locked(exception) else 'error'
+                    error_messages.setdefault(type(exception).__name__, str(exception)[:200])
+                latency = time.perf_counter() - arrival
+                # End the operation's transaction, so that reads do not hold locks between operations
+                session.close()
+                results[worker].append((operation.kind, latency, error))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=run, args=(worker,), name=f'workload-{worker}') for worker in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    by_kind = {}
+    for worker_results in results:
+        for kind, latency, error in worker_results:
+            latencies, errors, locked = by_kind.setdefault(kind, ([], [0], [0]))
+            latencies.append(latency)
+            errors[0] += error is not None
+            locked[0] += error == 'locked'
+
+    completed = [result for worker_results in results for result in worker_results]
+    return {
+        'operations': len(completed),
+        'workers': workers,
+        'seconds': elapsed,
+        'throughput': len(completed) / elapsed if elapsed else None,
+        'errors': sum(error is not None for _, _, error in completed),
+        'locked': sum(error == 'locked' for _, _, error in completed),
+        'locked_seconds': sum(latency for _, latency, error in completed if error == 'locked'),
+        'error_messages': error_messages,
+        'by_kind': {kind: _summarize(kind, latencies, errors[0], locked[0])
+                    for kind, (latencies, errors, locked) in sorted(by_kind.items())},
+    }
+
+if __name__ == "__main__":
+    user_ids = session.scalars(select(User.id)).all()
+    session.close()
+    report = replay(generate_workload(user_ids, n=1000, seed=0), workers=4)
+    print(f"{report['operations']} operations in {report['seconds']:.2f}s: {report['throughput']:.0f} ops/s, "
+          f"{report['errors']} errors, {report['locked']} database is locked")
+    for summary in report['by_kind'].values():
+        print(f"{summary['kind']:<28} {summary['count']:>5} ops, p50 {summary['p50_ms']:.2f}ms, "
+              f"p95 {summary['p95_ms']:.2f}ms, p99 {summary['p99_ms']:.2f}ms, {summary['locked']} locked")